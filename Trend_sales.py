@@ -2,9 +2,11 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from datetime import datetime, timedelta
 import numpy as np
 
+from data_loader import REQUIRED_COLUMNS, LEDGER_FILE_TYPES, load_ledger
+from fiscal_calendar import fiscal_calendar
+
 # Configure page
 st.set_page_config(page_title="Sales Trend Analysis", layout="wide")
 
@@ -49,14 +51,9 @@ def load_sample_data():
 def prepare_data(df):
     df['Date'] = pd.to_datetime(df['Posting Date'])
     df['Abs_Sales'] = abs(df['Sales Amount'])
-    df['Fiscal_Year'] = df['Date'].apply(lambda x: x.year if x.month >= 7 else x.year - 1)
-
-    def get_fiscal_week(date):
-        days_since_friday = (date.weekday() + 3) % 7
-        week_start = date - timedelta(days=days_since_friday)
-        return week_start.strftime('%Y-%m-%d')
-    
-    df['Fiscal_Week'] = df['Date'].apply(get_fiscal_week)
+    calendar = fiscal_calendar(df['Date'])
+    df['Fiscal_Year'] = calendar['Fiscal_Year']
+    df['Fiscal_Week'] = calendar['Fiscal_Week_Start'].dt.strftime('%Y-%m-%d')
     df['Month'] = df['Date'].dt.strftime('%B')
     df['Month_Num'] = df['Date'].dt.month
     
@@ -135,20 +132,18 @@ def create_yearly_trend(df, customer_filter=None):
     return fig, yearly_data
 
 def validate_data_structure(df):
-    required_columns = ['Posting Date', 'Item No', 'Description', 
-                        'Source No', 'Name', 'Invoiced Quantity', 'Sales Amount']
-    return all(col in df.columns for col in required_columns)
+    return all(col in df.columns for col in REQUIRED_COLUMNS)
 
 # Main app logic
 def main():
     df = load_sample_data()
 
-    st.sidebar.header("📁 Data Upload (Excel Only)")
-    uploaded_file = st.sidebar.file_uploader("Upload your sales data (Excel only)", type=['xlsx', 'xls'])
+    st.sidebar.header("📁 Data Upload")
+    uploaded_file = st.sidebar.file_uploader("Upload your sales data (Excel, CSV, Parquet or Arrow)", type=LEDGER_FILE_TYPES)
 
     if uploaded_file:
         try:
-            uploaded_df = pd.read_excel(uploaded_file)
+            uploaded_df = load_ledger(uploaded_file)
             if validate_data_structure(uploaded_df):
                 df = uploaded_df
                 st.sidebar.success("✅ File uploaded and validated successfully.")
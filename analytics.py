@@ -0,0 +1,102 @@
+"""Year-over-year, rolling-window and fiscal-year-to-date metrics over the weekly aggregate.
+
+Every customer's weekly sales are scattered into dense numpy grids once, so
+each metric is a single array operation over all customers at the same time:
+
+* calendar grid (customer x Friday-to-Thursday week): trailing 4/13/52-week
+  sums are differences of a cumulative sum, so weeks without sales count as
+  zero instead of shortening the window;
+* fiscal grid (customer x fiscal year x week number): fiscal-year-to-date is a
+  cumulative sum along the week axis, and last year's value for the same week
+  number is the neighbouring fiscal year slice.
+"""
+import numpy as np
+import pandas as pd
+
+from cube import rollup
+from fiscal_calendar import MAX_WEEK_NUMBER
+from trend_tables import get_filtered_data
+
+ROLLING_WINDOWS = (4, 13, 52)
+WEEK_KEYS = ['Fiscal_Year', 'Week_Number', 'Fiscal_Week_Start', 'Fiscal_Week_Str', 'Week_Label']
+
+
+def _percent_change(current, previous):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(previous > 0, (current - previous) / previous * 100, np.nan)
+
+
+def period_metrics(cube, customer_filter=None, fiscal_year_filter=None, by_customer=True,
+                   measure='Abs_Sales', windows=ROLLING_WINDOWS):
+    """One row per customer and fiscal week with YoY, rolling and fiscal-YTD columns.
+
+    cube is the aggregate cube or its FilterIndex. With by_customer=False every
+    selected customer is summed into a single 'All' series. Prior fiscal years
+    are always used for the comparisons; fiscal_year_filter only limits the rows
+    returned.
+    """
+    rows = get_filtered_data(cube, customer_filter)
+    names = ['Name'] if by_customer else []
+    pieces = rollup(rows, names + WEEK_KEYS)
+    if not by_customer:
+        pieces.insert(0, 'Name', 'All')
+    if pieces.empty:
+        return pieces
+
+    # Calendar weeks: every Fiscal_Week_Start is a Friday, so weeks are 7 days apart
+    customers, _ = pd.factorize(pieces['Name'])
+    days = pieces['Fiscal_Week_Start'].to_numpy(dtype='datetime64[D]').astype(np.int64)
+    weeks = (days - days.min()) // 7
+    n_customers, n_weeks = customers.max() + 1, weeks.max() + 1
+    calendar = np.bincount(customers * n_weeks + weeks, weights=pieces[measure].to_numpy(dtype=np.float64),
+                           minlength=n_customers * n_weeks).reshape(n_customers, n_weeks)
+
+    # Week 1 can span two calendar weeks (the days before the first Friday and the
+    # week from it), so fiscal weeks are summed and keep the last calendar week
+    pieces['_customer'], pieces['_week'] = customers, weeks
+    pieces = pieces.sort_values(['_customer', 'Fiscal_Year', 'Week_Number', 'Fiscal_Week_Start'])
+    weekly = pieces.groupby(['_customer', 'Fiscal_Year', 'Week_Number'], sort=False).agg(
+        Name=('Name', 'first'),
+        Fiscal_Week_Start=('Fiscal_Week_Start', 'first'),
+        Fiscal_Week_Str=('Fiscal_Week_Str', 'first'),
+        Week_Label=('Week_Label', 'first'),
+        _week=('_week', 'last'),
+        **{measure: (measure, 'sum')}
+    ).reset_index()
+    customers = weekly.pop('_customer').to_numpy()
+    weeks = weekly.pop('_week').to_numpy()
+    weekly = weekly[['Name'] + WEEK_KEYS + [measure]]
+    values = weekly[measure].to_numpy(dtype=np.float64)
+
+    running = np.cumsum(calendar, axis=1)
+    for window in windows:
+        trailing = running.copy()
+        trailing[:, window:] -= running[:, :-window]
+        weekly[f'Rolling_{window}'] = trailing[customers, weeks]
+
+    # Fiscal weeks: week number slots within each fiscal year
+    fiscal_years = weekly['Fiscal_Year'].to_numpy(dtype=np.int64)
+    years = fiscal_years - fiscal_years.min()
+    n_years = years.max() + 1
+    slots = weekly['Week_Number'].to_numpy(dtype=np.int64) - 1
+    fiscal = np.bincount((customers * n_years + years) * MAX_WEEK_NUMBER + slots, weights=values,
+                         minlength=n_customers * n_years * MAX_WEEK_NUMBER
+                         ).reshape(n_customers, n_years, MAX_WEEK_NUMBER)
+    to_date = np.cumsum(fiscal, axis=2)
+
+    # The first fiscal year in the data has no prior year to compare with
+    has_prior = years > 0
+    prior_years = np.maximum(years - 1, 0)
+    last_year = np.where(has_prior, fiscal[customers, prior_years, slots], np.nan)
+    fytd_last_year = np.where(has_prior, to_date[customers, prior_years, slots], np.nan)
+
+    weekly['Sales_LY'] = last_year
+    weekly['YoY_Delta'] = values - last_year
+    weekly['YoY_Pct'] = _percent_change(values, last_year)
+    weekly['FYTD'] = to_date[customers, years, slots]
+    weekly['FYTD_LY'] = fytd_last_year
+    weekly['FYTD_YoY_Pct'] = _percent_change(weekly['FYTD'].to_numpy(), fytd_last_year)
+
+    if fiscal_year_filter and fiscal_year_filter != "All":
+        weekly = weekly[weekly['Fiscal_Year'] == int(fiscal_year_filter)].reset_index(drop=True)
+    return weekly
@@ -0,0 +1,160 @@
+"""Unusual weeks in the weekly customer x item aggregate, with returns kept apart from sales.
+
+The prepared ledger only carries Abs_Sales, which folds returns and credit
+notes into the trend. Here the signed Sales Amount is split into a Sales and
+a Returns measure per customer, item and week, and each measure is scored on
+its own against that item's recent history:
+
+* the history is the previous ROLLING_WEEKS weeks in which the customer
+  bought (or returned) the item, so quiet weeks never count as zeros;
+* the score is the modified z-score 0.6745 * (x - median) / MAD, falling back
+  to the mean absolute deviation when the MAD is zero (Iglewicz and Hoaglin),
+  and to a fraction of the median when the history is completely flat.
+
+Every series is laid out end to end in one sorted array, and the trailing
+windows are strided views of it sorted row-wise, so medians and MADs for
+millions of cells are a few vectorized sorts rather than a groupby per item.
+"""
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+ANOMALY_KEYS = ['Name', 'Item No', 'Fiscal_Week_Start']
+ANOMALY_MEASURES = ['Sales', 'Returns']
+
+ROLLING_WEEKS = 13
+MIN_HISTORY = 4
+Z_THRESHOLD = 3.5
+# Spread assumed for a flat history (every earlier week the same amount), as a
+# fraction of that amount, so a change scores finitely instead of as infinity
+FLAT_HISTORY_SCALE = 0.1
+
+# Cells scored per block, which bounds the strided windows to about 30 MB
+BLOCK_CELLS = 1 << 18
+
+
+def build_signed_item_cube(df):
+    """Sales and returns (both positive amounts) per customer, item and fiscal week of a prepared ledger"""
+    amounts = df['Sales Amount'].to_numpy(dtype=np.float64)
+    cells = df[ANOMALY_KEYS].assign(Sales=np.where(amounts > 0, amounts, 0.0),
+                                    Returns=np.where(amounts < 0, -amounts, 0.0))
+    return cells.groupby(ANOMALY_KEYS, as_index=False, observed=True, sort=False)[ANOMALY_MEASURES].sum()
+
+
+def _window_median(windows, counts):
+    # NaN sorts last, so each row's valid values are its first counts entries
+    ordered = np.sort(windows, axis=1)
+    rows = np.arange(len(ordered))
+    lower = np.maximum(counts - 1, 0) // 2
+    upper = counts // 2
+    return (ordered[rows, lower] + ordered[rows, upper]) / 2
+
+
+def rolling_robust_z(values, series, window=ROLLING_WEEKS, min_history=MIN_HISTORY):
+    """Trailing median and modified z-score of each value against the previous window values of its series.
+
+    values and series are flat arrays sorted by series, then time. Values with
+    fewer than min_history earlier values in their series get a NaN score.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    series = np.asarray(series, dtype=np.int64)
+    median = np.full(len(values), np.nan)
+    z_score = np.full(len(values), np.nan)
+
+    # Row i of the strided view holds the window values just before value i
+    padded = sliding_window_view(np.concatenate([np.full(window, np.nan), values[:-1]]), window)
+    owners = sliding_window_view(np.concatenate([np.full(window, -1), series[:-1]]), window)
+
+    for start in range(0, len(values), BLOCK_CELLS):
+        block = slice(start, start + BLOCK_CELLS)
+        windows = np.where(owners[block] == series[block, None], padded[block], np.nan)
+        counts = np.count_nonzero(~np.isnan(windows), axis=1)
+        centre = _window_median(windows, counts)
+
+        deviations = np.abs(windows - centre[:, None])
+        mad = _window_median(deviations, counts)
+        mean_ad = np.nansum(deviations, axis=1) / np.maximum(counts, 1)
+
+        # Amounts are positive, so the flat-history scale is never zero either
+        scale = np.select([mad > 0, mean_ad > 0], [mad / 0.6745, 1.253314 * mean_ad],
+                          FLAT_HISTORY_SCALE * np.abs(centre))
+        distance = values[block] - centre
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z = distance / scale
+        scored = counts >= min_history
+        median[block] = np.where(scored, centre, np.nan)
+        z_score[block] = np.where(scored, z, np.nan)
+    return median, z_score
+
+
+def score_cells(cells, window=ROLLING_WEEKS, min_history=MIN_HISTORY):
+    """One row per customer, item, week and measure with a nonzero amount, with its trailing median and z-score"""
+    names = cells['Name'].astype('category').cat.codes.to_numpy()
+    items = cells['Item No'].astype('category').cat.codes.to_numpy()
+    weeks = cells['Fiscal_Week_Start'].to_numpy()
+
+    scored = []
+    for measure in ANOMALY_MEASURES:
+        amounts = cells[measure].to_numpy(dtype=np.float64)
+        active = np.flatnonzero(amounts > 0)
+        order = active[np.lexsort((weeks[active], items[active], names[active]))]
+        series = np.cumsum(np.r_[True, (np.diff(names[order]) != 0) | (np.diff(items[order]) != 0)]) - 1
+
+        median, z_score = rolling_robust_z(amounts[order], series, window, min_history)
+        rows = cells[ANOMALY_KEYS].take(order).reset_index(drop=True)
+        rows['Measure'] = measure
+        rows['Amount'] = amounts[order]
+        rows['Median'] = median
+        rows['Z_Score'] = z_score
+        scored.append(rows)
+    return pd.concat(scored, ignore_index=True)
+
+
+def detect_anomalies(df, window=ROLLING_WEEKS, min_history=MIN_HISTORY, threshold=Z_THRESHOLD):
+    """Customer x item weeks of a prepared ledger whose sales or returns are unusual for that item.
+
+    Only cells scoring above threshold (in either direction) are returned,
+    largest deviations first.
+    """
+    scored = score_cells(build_signed_item_cube(df), window, min_history)
+    flagged = scored[np.abs(scored['Z_Score'].to_numpy()) > threshold]
+    return flagged.sort_values('Z_Score', key=np.abs, ascending=False).reset_index(drop=True)
+
+
+def update_anomalies(anomalies, df, new_rows, window=ROLLING_WEEKS, min_history=MIN_HISTORY,
+                     threshold=Z_THRESHOLD):
+    """detect_anomalies of a ledger after new_rows were appended to it, given the result from before.
+
+    A score only depends on its own customer and item's history, so only the
+    series with appended rows are scored again.
+    """
+    names, items = new_rows['Name'].unique(), new_rows['Item No'].unique()
+
+    def _touched(frame):
+        return frame['Name'].isin(names) & frame['Item No'].isin(items)
+
+    rescored = detect_anomalies(df[_touched(df)], window, min_history, threshold)
+    merged = pd.concat([anomalies[~_touched(anomalies)], rescored], ignore_index=True)
+    return merged.sort_values('Z_Score', key=np.abs, ascending=False).reset_index(drop=True)
+
+
+def weekly_flags(anomalies, customer_filter=None):
+    """Flagged cells per week for one customer (or all), with the items behind them for hover text"""
+    if customer_filter and customer_filter != "All":
+        anomalies = anomalies[anomalies['Name'] == customer_filter]
+    columns = ['Fiscal_Week_Start', 'Sales_Flags', 'Return_Flags', 'Items']
+    if anomalies.empty:
+        return pd.DataFrame(columns=columns)
+
+    labels = (anomalies['Item No'].astype(str) + ' ' + anomalies['Measure'].str.lower()
+              + ' ' + anomalies['Amount'].round(2).astype(str))
+    flags = anomalies.assign(
+        Sales_Flags=(anomalies['Measure'] == 'Sales').astype(int),
+        Return_Flags=(anomalies['Measure'] == 'Returns').astype(int),
+        Items=labels,
+    ).groupby('Fiscal_Week_Start', as_index=False).agg(
+        Sales_Flags=('Sales_Flags', 'sum'),
+        Return_Flags=('Return_Flags', 'sum'),
+        Items=('Items', lambda items: '<br>'.join(items.head(5))),
+    )
+    return flags[columns]
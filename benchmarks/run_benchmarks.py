@@ -0,0 +1,266 @@
+"""Time and memory-profile each stage of both dashboards on synthetic ledgers.
+
+    python -m benchmarks.run_benchmarks --rows 10000 100000 1000000
+    python -m benchmarks.run_benchmarks --rows 10000 100000 --record
+
+Stages of trend.py (load, prepare, cube, filter index, filtering, the three
+trend tables and the Plotly figures) and of Trend_sales.py (prepare and its
+three chart builders) are run in order on the same ledger. Each result is
+compared against benchmarks/baselines.json; --record overwrites the
+baselines for the sizes that were run (baselines are machine specific, so
+record them on the host you compare on). Each stage is timed on its own and
+then re-run under tracemalloc for its peak memory, because tracing inflates
+the wall time of allocation-heavy stages several times over.
+"""
+import argparse
+import gc
+import json
+import logging
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+
+from benchmarks.synthetic_ledger import write_ledger
+from cube import build_cube
+from data_loader import load_ledger
+from filter_index import FilterIndex
+from fiscal_calendar import calendar_table
+from preparation import prepare_ledger
+from trend_tables import get_filtered_data, weekly_trend_table, monthly_trend_table, yearly_trend_table
+
+BASELINES_PATH = Path(__file__).with_name('baselines.json')
+IMPLEMENTATIONS = ('trend', 'Trend_sales')
+
+# Filters and charts are timed over this many of the busiest customers, like reruns
+CUSTOMER_SAMPLE = 10
+
+
+def _rows(value):
+    """Row count of a frame, or total rows of a list of per-customer results"""
+    if isinstance(value, pd.DataFrame):
+        return len(value)
+    if isinstance(value, list) and all(isinstance(item, pd.DataFrame) for item in value):
+        return sum(len(item) for item in value)
+    return None
+
+
+def measure(func, memory=True):
+    """Time func(), then optionally re-run it under tracemalloc; returns result, seconds, peak MB"""
+    gc.collect()
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+
+    peak_mb = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        func()
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        tracemalloc.stop()
+    return result, seconds, peak_mb
+
+
+def _for_customers(func, target, customers):
+    return [func(target, customer) for customer in customers]
+
+
+def _import_app(module_name):
+    # Both apps run st.set_page_config at import, which in bare mode only logs
+    # warnings; streamlit configures its own loggers, so quieten them afterwards
+    import streamlit  # noqa: F401
+    for name in list(logging.root.manager.loggerDict):
+        if name.startswith('streamlit'):
+            logging.getLogger(name).setLevel(logging.ERROR)
+    return __import__(module_name)
+
+
+def _warm_up_plotly():
+    # plotly express loads its templates and validators on first use, which
+    # would otherwise be charged to whichever figure stage runs first
+    import plotly.express as px
+    px.line(pd.DataFrame({'x': [0, 1], 'y': [0, 1]}), x='x', y='y').to_json()
+
+
+def trend_stages(ledger_path, customers):
+    """(stage, input name, callable) triples for trend.py's pipeline, plus the state they share"""
+    # Importing the app (streamlit and plotly) takes seconds and is not part of any stage
+    trend = _import_app('trend')
+    _warm_up_plotly()
+    state = {}
+
+    def load():
+        state['ledger'] = load_ledger(ledger_path)
+        return state['ledger']
+
+    def prepare():
+        # Start from a cold calendar table, as a fresh process would
+        calendar_table.cache_clear()
+        state['prepared'] = prepare_ledger(state['ledger'])
+        return state['prepared']
+
+    def cube():
+        state['cube'] = build_cube(state['prepared'])
+        return state['cube']
+
+    def filter_index():
+        state['index'] = FilterIndex(state['cube'])
+        return state['index'].frame
+
+    def filter_rows():
+        return _for_customers(get_filtered_data, state['prepared'], customers)
+
+    def filter_indexed():
+        state['index'].clear_cache()
+        return _for_customers(get_filtered_data, state['index'], customers)
+
+    def weekly():
+        state['index'].clear_cache()
+        return _for_customers(weekly_trend_table, state['index'], customers)
+
+    def monthly():
+        state['index'].clear_cache()
+        return _for_customers(monthly_trend_table, state['index'], customers)
+
+    def yearly():
+        state['index'].clear_cache()
+        return _for_customers(yearly_trend_table, state['index'], customers)
+
+    def figures():
+        state['index'].clear_cache()
+        return [
+            (trend.create_weekly_trend(state['index'], customer, "All", "All", "All"),
+             trend.create_monthly_trend(state['index'], customer),
+             trend.create_yearly_trend(state['index'], customer))
+            for customer in customers
+        ]
+
+    stages = [('load', None, load), ('prepare', 'ledger', prepare), ('cube', 'prepared', cube),
+              ('filter_index', 'cube', filter_index), ('filter_rows', 'prepared', filter_rows),
+              ('filter_indexed', 'cube', filter_indexed), ('weekly', 'cube', weekly),
+              ('monthly', 'cube', monthly), ('yearly', 'cube', yearly), ('figures', 'cube', figures)]
+    return stages, state
+
+
+def trend_sales_stages(ledger_path, customers):
+    """Stages of Trend_sales.py, which charts straight from the row-level frame"""
+    app = _import_app('Trend_sales')
+    _warm_up_plotly()
+    state = {}
+
+    def load():
+        state['ledger'] = load_ledger(ledger_path)
+        return state['ledger']
+
+    def prepare():
+        # prepare_data adds columns in place, so it gets its own copy
+        state['prepared'] = app.prepare_data(state['ledger'].copy())
+        return state['prepared']
+
+    def weekly():
+        return _for_customers(app.create_weekly_trend, state['prepared'], customers)
+
+    def monthly():
+        return _for_customers(app.create_monthly_trend, state['prepared'], customers)
+
+    def yearly():
+        return _for_customers(app.create_yearly_trend, state['prepared'], customers)
+
+    stages = [('load', None, load), ('prepare', 'ledger', prepare), ('weekly', 'prepared', weekly),
+              ('monthly', 'prepared', monthly), ('yearly', 'prepared', yearly)]
+    return stages, state
+
+
+STAGE_BUILDERS = {'trend': trend_stages, 'Trend_sales': trend_sales_stages}
+
+
+def run(rows, implementations=IMPLEMENTATIONS, memory=True, seed=0, workdir=None):
+    """Benchmark every stage for one ledger size, returning one dict per stage"""
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        ledger_path = write_ledger(Path(tmp) / 'ledger.parquet', rows, seed)
+        busiest = load_ledger(ledger_path)['Name'].value_counts().index[:CUSTOMER_SAMPLE]
+        customers = ["All"] + busiest.tolist()
+
+        results = []
+        for implementation in implementations:
+            stages, state = STAGE_BUILDERS[implementation](ledger_path, customers)
+            for stage, input_name, func in stages:
+                output, seconds, peak_mb = measure(func, memory=memory)
+                results.append({
+                    'implementation': implementation,
+                    'stage': stage,
+                    'rows': rows,
+                    'rows_in': _rows(state[input_name]) if input_name else None,
+                    'rows_out': _rows(output),
+                    'seconds': round(seconds, 6),
+                    'peak_mb': None if peak_mb is None else round(peak_mb, 3),
+                })
+            # A stage that silently drops rows would time a different ledger
+            assert len(state['prepared']) == len(state['ledger']), (
+                f"{implementation} prepared {len(state['prepared'])} of {len(state['ledger'])} rows")
+        return results
+
+
+def _baseline_key(result):
+    return f"{result['implementation']}/{result['stage']}/{result['rows']}"
+
+
+def load_baselines(path=BASELINES_PATH):
+    if not Path(path).exists():
+        return {}
+    return json.loads(Path(path).read_text())
+
+
+def record_baselines(results, path=BASELINES_PATH):
+    baselines = load_baselines(path)
+    for result in results:
+        baselines[_baseline_key(result)] = {'seconds': result['seconds'], 'peak_mb': result['peak_mb']}
+    Path(path).write_text(json.dumps(dict(sorted(baselines.items())), indent=2) + "\n")
+
+
+def compare(results, baselines, tolerance):
+    """Results table with ratios against the baselines and a regression flag"""
+    table = pd.DataFrame(results)
+    reference = table.apply(lambda row: baselines.get(_baseline_key(row), {}), axis=1)
+    table['base_seconds'] = [entry.get('seconds') for entry in reference]
+    table['base_peak_mb'] = [entry.get('peak_mb') for entry in reference]
+    table['time_ratio'] = (table['seconds'] / table['base_seconds'].astype(float)).round(2)
+    table['regressed'] = table['time_ratio'] > tolerance
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard stages on synthetic ledgers.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--implementations', nargs='+', choices=IMPLEMENTATIONS, default=list(IMPLEMENTATIONS))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc pass")
+    parser.add_argument('--record', action='store_true', help="store these results as the new baselines")
+    parser.add_argument('--tolerance', type=float, default=1.5,
+                        help="time ratio above which a stage counts as regressed")
+    parser.add_argument('--json', type=Path, help="also write the raw results to this file")
+    args = parser.parse_args(argv)
+
+    results = []
+    for rows in args.rows:
+        results.extend(run(rows, args.implementations, memory=not args.no_memory, seed=args.seed))
+
+    table = compare(results, load_baselines(), args.tolerance)
+    with pd.option_context('display.width', 200, 'display.max_rows', None):
+        print(table.to_string(index=False))
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2) + "\n")
+    if args.record:
+        record_baselines(results)
+        print(f"Recorded baselines in {BASELINES_PATH}")
+    elif table['regressed'].any():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Reproducible synthetic sales ledgers for benchmarking, from 10k to 50M rows.
+
+    python -m benchmarks.synthetic_ledger 5000000 ledger_5m.parquet
+
+Customers and items follow Zipf-like popularity, dates lean towards
+weekdays, the high season and recent years, and a few percent of rows are
+returns (positive quantity, negative amount) or data-entry spikes, like
+the real ERP exports. Large ledgers are generated and written chunk by chunk.
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from data_loader import REQUIRED_COLUMNS
+from fiscal_calendar import SEASON_NAMES
+
+FAMILIES = ['BCH', 'BOG', 'DIC', 'BDY', 'BOI', 'BRC', 'BFC']
+PRODUCTS = ['Gouda Portion 200g', 'Organic Whole Milk - 420mL', 'Vanilla Bean Ice Cream 500mL',
+            'Unsalted Butter 500g', 'Other sale Items', 'Grated Parmesan 100g', 'Margarita Pizza']
+CUSTOMER_KINDS = ['Online Subscription', 'Supermarket', 'Hotel', 'Restaurant', 'Cafe', 'Distributor']
+
+DEFAULT_CHUNK_ROWS = 1_000_000
+RETURN_RATE = 0.03
+SPIKE_RATE = 0.0005
+
+
+def _zipf_weights(count, exponent):
+    weights = 1.0 / np.arange(1, count + 1) ** exponent
+    return weights / weights.sum()
+
+
+def _date_weights(days):
+    """Relative posting volume per day: weekday, seasonal and growth effects"""
+    weekday = (days.astype(np.int64) + 3) % 7
+    months = days.astype('datetime64[M]').astype(np.int64) % 12 + 1
+    season = SEASON_NAMES[months - 1]
+
+    weights = np.where(weekday >= 5, 0.35, 1.0)
+    weights = weights * np.select([season == "High Season", season == "Low Season"], [1.6, 0.7], 1.0)
+    weights = weights * np.linspace(1.0, 2.0, len(days))
+    return weights / weights.sum()
+
+
+def ledger_chunks(rows, seed=0, start='2019-07-01', years=5, customers=500, items=5000,
+                  chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Yield a synthetic ledger of `rows` rows as DataFrames of at most chunk_rows rows"""
+    rng = np.random.default_rng(seed)
+
+    days = np.arange(np.datetime64(start), np.datetime64(start) + np.timedelta64(365 * years, 'D'))
+    date_weights = _date_weights(days)
+    # Real datetimes, as Excel and Parquet exports carry them: trend.py parses text
+    # day first and Trend_sales month first, so any text layout favours one of them
+    dates = days.astype('datetime64[ns]')
+
+    customer_names = np.array([f"{CUSTOMER_KINDS[i % len(CUSTOMER_KINDS)]} {i:04d}" for i in range(customers)],
+                              dtype=object)
+    customer_sources = np.array([str(10000 + i) for i in range(customers)], dtype=object)
+    customer_weights = _zipf_weights(customers, 1.1)
+
+    item_families = rng.integers(0, len(FAMILIES), items)
+    item_numbers = np.array([f"{FAMILIES[f]}-{10000 + i}" for i, f in enumerate(item_families)], dtype=object)
+    item_descriptions = np.array([f"{PRODUCTS[f]} #{i}" for i, f in enumerate(item_families)], dtype=object)
+    item_prices = np.round(rng.lognormal(5.8, 0.6, items), 2)
+    item_weights = _zipf_weights(items, 0.9)
+
+    remaining = rows
+    while remaining > 0:
+        size = min(chunk_rows, remaining)
+        remaining -= size
+
+        date_idx = rng.choice(len(days), size, p=date_weights)
+        customer_idx = rng.choice(customers, size, p=customer_weights)
+        item_idx = rng.choice(items, size, p=item_weights)
+
+        quantity = -rng.geometric(0.45, size).astype(np.int64)
+        amount = np.round(-quantity * item_prices[item_idx], 2)
+
+        # Returns and credit notes flip both signs, spikes are fat-fingered amounts
+        returns = rng.random(size) < RETURN_RATE
+        quantity[returns] = -quantity[returns]
+        amount[returns] = -amount[returns]
+        spikes = rng.random(size) < SPIKE_RATE
+        amount[spikes] = amount[spikes] * rng.choice([10, 100], spikes.sum())
+
+        yield pd.DataFrame({
+            'Posting Date': dates[date_idx],
+            'Item No': item_numbers[item_idx],
+            'Description': item_descriptions[item_idx],
+            'Source No': customer_sources[customer_idx],
+            'Name': customer_names[customer_idx],
+            'Invoiced Quantity': quantity,
+            'Sales Amount': amount,
+        }, columns=REQUIRED_COLUMNS)
+
+
+def generate_ledger(rows, seed=0, **options):
+    """A synthetic ledger held fully in memory (use write_ledger for very large sizes)"""
+    return pd.concat(ledger_chunks(rows, seed, **options), ignore_index=True)
+
+
+def write_ledger(path, rows, seed=0, **options):
+    """Write a synthetic ledger to CSV or Parquet one chunk at a time"""
+    path = Path(path)
+    if path.suffix.lower() == '.csv':
+        for number, chunk in enumerate(ledger_chunks(rows, seed, **options)):
+            chunk.to_csv(path, mode='w' if number == 0 else 'a', header=number == 0, index=False)
+        return path
+
+    writer = None
+    try:
+        for chunk in ledger_chunks(rows, seed, **options):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic sales ledger.")
+    parser.add_argument('rows', type=int)
+    parser.add_argument('path', type=Path, help=".csv or .parquet output file")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--customers', type=int, default=500)
+    parser.add_argument('--items', type=int, default=5000)
+    parser.add_argument('--years', type=int, default=5)
+    args = parser.parse_args(argv)
+    write_ledger(args.path, args.rows, args.seed,
+                 customers=args.customers, items=args.items, years=args.years)
+
+
+if __name__ == "__main__":
+    main()
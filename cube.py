@@ -0,0 +1,28 @@
+from schema import with_unknown
+
+# Customer x fiscal year x calendar year x month x fiscal week. The label columns
+# are functions of these keys and ride along so charts never touch raw rows.
+CUBE_KEYS = [
+    'Name', 'Fiscal_Year', 'Year', 'Month_Num', 'Month', 'Season',
+    'Fiscal_Week_Start', 'Fiscal_Week_Str', 'Week_Number', 'Week_Label',
+]
+CUBE_MEASURES = ['Abs_Sales', 'Quantity']
+
+
+def build_cube(df):
+    """Pre-aggregate a prepared ledger to one row per customer, month and fiscal week.
+
+    Rows without a customer name are kept under schema.UNKNOWN_LABEL.
+    """
+    keys = [key for key in CUBE_KEYS if key in df.columns]
+    if 'Name' in df.columns:
+        df = df.assign(Name=with_unknown(df['Name']))
+    return df.groupby(keys, as_index=False, observed=True, sort=False).agg(
+        Abs_Sales=('Abs_Sales', 'sum'),
+        Quantity=('Invoiced Quantity', 'sum')
+    )
+
+
+def rollup(cube, keys):
+    """Sum the cube measures up to a coarser set of keys, keeping rows with a missing key"""
+    return cube.groupby(keys, as_index=False, observed=True, dropna=False)[CUBE_MEASURES].sum()
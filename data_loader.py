@@ -0,0 +1,303 @@
+import hashlib
+import io
+import os
+import warnings
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pandas.tseries.api import guess_datetime_format
+
+REQUIRED_COLUMNS = ['Posting Date', 'Item No', 'Description',
+                    'Source No', 'Name', 'Invoiced Quantity', 'Sales Amount']
+
+# Posting Date stays text here, prepare_data parses it (day first)
+LEDGER_DTYPES = {
+    'Posting Date': str,
+    'Item No': str,
+    'Description': str,
+    'Source No': str,
+    'Name': str,
+    'Invoiced Quantity': 'float64',
+    'Sales Amount': 'float64',
+}
+# Excel date cells come back as datetimes, so let openpyxl keep their type
+EXCEL_DTYPES = {column: dtype for column, dtype in LEDGER_DTYPES.items() if column != 'Posting Date'}
+
+EXCEL_SUFFIXES = ('.xlsx', '.xls')
+CSV_SUFFIXES = ('.csv',)
+PARQUET_SUFFIXES = ('.parquet', '.pq')
+ARROW_SUFFIXES = ('.arrow', '.feather', '.ipc')
+LEDGER_FILE_TYPES = [suffix.lstrip('.') for suffix in
+                     EXCEL_SUFFIXES + CSV_SUFFIXES + PARQUET_SUFFIXES + ARROW_SUFFIXES]
+
+# Rows per chunk when streaming a ledger that should not be loaded whole
+DEFAULT_CHUNK_ROWS = 1_000_000
+
+# Excel uploads are converted to Parquet once and re-read from here afterwards.
+# The least recently read sheets are evicted once the directory grows past
+# EXCEL_CACHE_MAX_BYTES.
+EXCEL_CACHE_DIR = Path('.ledger_cache') / 'excel'
+EXCEL_CACHE_MAX_BYTES = 1024 ** 3
+# Bump when the cached sheet contents change, so older conversions are re-read from the workbook
+EXCEL_CACHE_VERSION = 3
+
+
+def _is_required(column):
+    return column in LEDGER_DTYPES
+
+
+def _source_name(source):
+    return getattr(source, 'name', str(source))
+
+
+def _is_local_path(source):
+    return isinstance(source, (str, Path))
+
+
+def file_digest(content):
+    """Content hash of a ledger file; blake2b runs at memory speed even on large exports"""
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+# Local files are hashed this many bytes at a time, so they are never read into memory whole
+HASH_CHUNK_BYTES = 1 << 20
+
+
+def source_digest(source):
+    """file_digest of an upload or local file, streaming local files through the hash in chunks"""
+    digest = hashlib.blake2b(digest_size=16)
+    if _is_local_path(source):
+        with open(source, 'rb') as handle:
+            for chunk in iter(lambda: handle.read(HASH_CHUNK_BYTES), b''):
+                digest.update(chunk)
+    else:
+        # Uploads are already in memory; hash their buffer without copying it
+        digest.update(source.getbuffer() if hasattr(source, 'getbuffer') else source.getvalue())
+    return digest.hexdigest()
+
+
+def read_source_bytes(source):
+    if _is_local_path(source):
+        return Path(source).read_bytes()
+    return source.getvalue()
+
+
+def _apply_ledger_dtypes(df):
+    """Cast the columns that columnar files may store with a different type"""
+    for column, dtype in LEDGER_DTYPES.items():
+        if column not in df.columns:
+            continue
+        if column == 'Posting Date':
+            if not pd.api.types.is_datetime64_any_dtype(df[column]):
+                df[column] = _posting_dates(df[column])
+        elif dtype is str:
+            if pd.api.types.is_numeric_dtype(df[column]):
+                df[column] = df[column].astype(str).where(df[column].notna())
+        else:
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+def _posting_dates(column):
+    # Excel can hand back a mix of real dates and text, which Parquet cannot store. The
+    # dates stay datetimes and only the text is parsed, day first like prepare_ledger,
+    # so every consumer reads the same dates. Pure text columns are left to the consumers.
+    if column.dtype != object or not any(isinstance(value, datetime) for value in column):
+        return column
+    return parse_dates(column)
+
+
+# Distinct leading values the date format is guessed from
+DATE_FORMAT_SAMPLE = 200
+
+
+def _day_first(date_format):
+    # Ties go to day-first layouts, except after a leading year (ISO order)
+    day, month = date_format.find('%d'), date_format.find('%m')
+    if date_format.startswith('%Y'):
+        return month < day
+    return day < month
+
+
+def guess_date_format(values, sample=DATE_FORMAT_SAMPLE):
+    """strftime format that parses the most of the first distinct text dates, or None.
+
+    pandas guesses from the first value alone, which for '23 May 2023' is a
+    full month name that no abbreviated month matches, so every guess is
+    scored against a sample instead.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return None
+    sample = pd.Series(values.dropna().head(sample * 50).astype(str).unique()[:sample])
+    with warnings.catch_warnings():
+        # Guessing day first on '12/25/2022' warns before falling back to month first
+        warnings.simplefilter('ignore', UserWarning)
+        formats = {guess_datetime_format(value, dayfirst=dayfirst)
+                   for value in sample for dayfirst in (True, False)} - {None}
+    if not formats:
+        return None
+    return max(sorted(formats), key=lambda date_format: (
+        pd.to_datetime(sample, format=date_format, errors='coerce').notna().sum(), _day_first(date_format)))
+
+
+def parse_dates(values, date_format=None):
+    """Posting dates parsed with one format for the whole column, NaT where a value is not a date.
+
+    date_format defaults to guess_date_format(values); pass the same format to
+    every chunk of a file so they all read dates alike. Values in another
+    layout are parsed one by one, day first.
+    """
+    if date_format is None:
+        date_format = guess_date_format(values)
+    if date_format is None:
+        return pd.to_datetime(values, format='mixed', dayfirst=True, errors='coerce')
+
+    dates = pd.to_datetime(values, format=date_format, errors='coerce')
+    retry = dates.isna() & values.notna()
+    if retry.any():
+        dates[retry] = pd.to_datetime(values[retry], format='mixed', dayfirst=True, errors='coerce')
+    return dates
+
+
+def _present_columns(names):
+    return [column for column in REQUIRED_COLUMNS if column in names]
+
+
+def _open_parquet(source):
+    # Local files are memory-mapped, uploads are already in memory
+    memory_map = _is_local_path(source)
+    if not memory_map:
+        source = io.BytesIO(source.getvalue())
+    return pq.ParquetFile(source, memory_map=memory_map)
+
+
+def _open_arrow(source):
+    if _is_local_path(source):
+        return pa.ipc.open_file(pa.memory_map(str(source), 'r'))
+    return pa.ipc.open_file(pa.BufferReader(source.getvalue()))
+
+
+def read_csv_ledger(source):
+    return pd.read_csv(source, usecols=_is_required, dtype=LEDGER_DTYPES)
+
+
+def read_parquet_ledger(source):
+    parquet_file = _open_parquet(source)
+    columns = _present_columns(parquet_file.schema_arrow.names)
+    table = parquet_file.read(columns=columns)
+    return _apply_ledger_dtypes(table.to_pandas())
+
+
+def read_arrow_ledger(source):
+    reader = _open_arrow(source)
+    table = reader.read_all().select(_present_columns(reader.schema.names))
+    return _apply_ledger_dtypes(table.to_pandas())
+
+
+def iter_ledger_chunks(source, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Yield a CSV, Parquet or Arrow ledger as DataFrames of at most chunk_rows rows"""
+    suffix = Path(_source_name(source)).suffix.lower()
+
+    if suffix in CSV_SUFFIXES:
+        with pd.read_csv(source, usecols=_is_required, dtype=LEDGER_DTYPES, chunksize=chunk_rows) as reader:
+            yield from reader
+    elif suffix in PARQUET_SUFFIXES:
+        parquet_file = _open_parquet(source)
+        columns = _present_columns(parquet_file.schema_arrow.names)
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=columns):
+            yield _apply_ledger_dtypes(batch.to_pandas())
+    elif suffix in ARROW_SUFFIXES:
+        reader = _open_arrow(source)
+        columns = _present_columns(reader.schema.names)
+        for index in range(reader.num_record_batches):
+            batch = reader.get_batch(index).select(columns)
+            yield _apply_ledger_dtypes(batch.to_pandas())
+    elif suffix in EXCEL_SUFFIXES:
+        raise ValueError("Excel files cannot be streamed, load them normally or convert them to CSV/Parquet")
+    else:
+        raise ValueError(f"Unsupported file type: {suffix or _source_name(source)}")
+
+
+def _excel_input(source):
+    # Local workbooks are opened from disk; uploads are already in memory
+    return source if _is_local_path(source) else io.BytesIO(read_source_bytes(source))
+
+
+def excel_sheet_names(source):
+    """Sheet names of a workbook, without parsing the cells"""
+    with pd.ExcelFile(_excel_input(source)) as workbook:
+        return workbook.sheet_names
+
+
+def evict_excel_cache(cache_dir=EXCEL_CACHE_DIR, max_bytes=EXCEL_CACHE_MAX_BYTES, keep=()):
+    """Drop the least recently read sheet files until the directory fits in max_bytes, never those in keep"""
+    keep = {Path(path) for path in keep}
+    stats = {}
+    for path in Path(cache_dir).glob('*.parquet'):
+        try:
+            stats[path] = path.stat()
+        except FileNotFoundError:
+            # Another process evicted it first
+            continue
+    total = sum(stat.st_size for stat in stats.values())
+
+    for path in sorted(set(stats) - keep, key=lambda path: stats[path].st_mtime):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= stats[path].st_size
+
+
+def read_excel_ledger(source, cache_dir=EXCEL_CACHE_DIR, sheet_name=0, digest=None):
+    """Read one sheet of an Excel ledger, converting it to Parquet on first sight so openpyxl runs once per sheet.
+
+    digest is the source's source_digest() when the caller already has it,
+    so a cached sheet is served without reading the workbook at all.
+    """
+    stem = f"{digest or source_digest(source)}-v{EXCEL_CACHE_VERSION}"
+    if sheet_name != 0:
+        stem += f"-{file_digest(str(sheet_name).encode())[:12]}"
+    cache_path = Path(cache_dir) / f"{stem}.parquet"
+
+    if not cache_path.exists():
+        df = pd.read_excel(_excel_input(source), sheet_name=sheet_name, usecols=_is_required, dtype=EXCEL_DTYPES)
+        df = _apply_ledger_dtypes(df)
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename so a concurrent session never reads a half-written file
+        tmp_path = cache_path.with_suffix(f'.{os.getpid()}.tmp')
+        df.to_parquet(tmp_path, index=False)
+        tmp_path.replace(cache_path)
+        ledger = read_parquet_ledger(cache_path)
+        evict_excel_cache(cache_dir, keep=[cache_path])
+        return ledger
+
+    # The file mtime is the LRU clock for eviction
+    os.utime(cache_path)
+    return read_parquet_ledger(cache_path)
+
+
+def load_ledger(source, cache_dir=EXCEL_CACHE_DIR):
+    """Load a ledger from an uploaded file or a local path, reading only the required columns"""
+    suffix = Path(_source_name(source)).suffix.lower()
+
+    if suffix in EXCEL_SUFFIXES:
+        return read_excel_ledger(source, cache_dir)
+    if suffix in CSV_SUFFIXES:
+        return read_csv_ledger(source)
+    if suffix in PARQUET_SUFFIXES:
+        return read_parquet_ledger(source)
+    if suffix in ARROW_SUFFIXES:
+        return read_arrow_ledger(source)
+    raise ValueError(f"Unsupported file type: {suffix or _source_name(source)}")
+
+
+def list_ledger_files(directory):
+    """Ledger files in a local directory that load_ledger can read"""
+    directory = Path(directory)
+    if not directory.is_dir():
+        return []
+    suffixes = EXCEL_SUFFIXES + CSV_SUFFIXES + PARQUET_SUFFIXES + ARROW_SUFFIXES
+    return sorted(path for path in directory.iterdir() if path.suffix.lower() in suffixes)
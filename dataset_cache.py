@@ -0,0 +1,84 @@
+import os
+import shutil
+import uuid
+from pathlib import Path
+
+import pyarrow.parquet as pq
+
+from data_loader import file_digest, source_digest
+
+# Bump whenever prepare_data, the calendar table, the dtype schema or the cube
+# change shape or meaning, so stale prepared datasets are never served
+DATASET_VERSION = 3
+
+DATASET_CACHE_DIR = Path('.ledger_cache') / 'datasets'
+DATASET_CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+
+def dataset_key(content, version=DATASET_VERSION):
+    return f"{file_digest(content)}-v{version}"
+
+
+def source_key(source, version=DATASET_VERSION):
+    """dataset_key of an upload or local file, hashing local files in chunks"""
+    return f"{source_digest(source)}-v{version}"
+
+
+def _entry_size(path):
+    return sum(file.stat().st_size for file in path.rglob('*') if file.is_file())
+
+
+def load_dataset(key, cache_dir=DATASET_CACHE_DIR):
+    """Prepared frames stored under a dataset key, or None on a cache miss.
+
+    Frames are decoded from Parquet into ordinary in-memory DataFrames; the
+    saving is skipping Excel parsing and preparation, not memory.
+    """
+    entry = Path(cache_dir) / key
+    if not entry.is_dir():
+        return None
+
+    frames = {
+        path.stem: pq.read_table(path).to_pandas()
+        for path in entry.glob('*.parquet')
+    }
+    # The directory mtime is the LRU clock for eviction
+    os.utime(entry)
+    return frames
+
+
+def store_dataset(key, frames, cache_dir=DATASET_CACHE_DIR, max_bytes=DATASET_CACHE_MAX_BYTES):
+    """Persist named frames (e.g. prepared ledger and cube) as Parquet under a dataset key"""
+    cache_dir = Path(cache_dir)
+    entry = cache_dir / key
+    if entry.is_dir():
+        return
+
+    # Build the entry in a scratch directory and rename it into place, so a
+    # concurrent reader never sees a partially written dataset
+    tmp_entry = cache_dir / f".{key}.{uuid.uuid4().hex}.tmp"
+    tmp_entry.mkdir(parents=True)
+    for name, frame in frames.items():
+        frame.to_parquet(tmp_entry / f"{name}.parquet", index=False)
+    try:
+        tmp_entry.rename(entry)
+    except OSError:
+        # Another session stored the same dataset first
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+
+    evict(cache_dir, max_bytes)
+
+
+def evict(cache_dir=DATASET_CACHE_DIR, max_bytes=DATASET_CACHE_MAX_BYTES, keep=()):
+    """Drop least recently used entries until the directory fits in max_bytes, never those in keep"""
+    keep = {Path(path) for path in keep}
+    entries = [path for path in Path(cache_dir).iterdir()
+               if path.is_dir() and not path.name.startswith('.') and path not in keep]
+    sizes = {entry: _entry_size(entry) for entry in entries}
+    total = sum(sizes.values()) + sum(_entry_size(path) for path in keep if path.is_dir())
+
+    for entry in sorted(entries, key=lambda path: path.stat().st_mtime):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= sizes[entry]
@@ -0,0 +1,99 @@
+import threading
+import weakref
+
+import pandas as pd
+
+# Leases are shallow copies, which only stay isolated under copy-on-write. pandas 3
+# always uses it; on pandas 2 it has to be switched on before any lease is handed out.
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.options.mode.copy_on_write = True
+
+
+class DatasetLease:
+    """One holder's read-only view of a registry entry.
+
+    The entry is released when the lease is garbage collected, so storing it
+    in a session's state ties the entry's lifetime to that session.
+    """
+
+    def __init__(self, key, frames):
+        self.key = key
+        self.frames = frames
+
+
+class DatasetRegistry:
+    """Process-wide prepared datasets shared by every session, one entry per dataset key.
+
+    Each entry is built once, however many sessions ask for it at the same
+    time, and is reference counted through leases: it is dropped as soon as
+    the last lease is gone. Leases hand out shallow copies of the frames, so
+    nothing is duplicated, and with pandas copy-on-write (enabled on import
+    for pandas 2) a holder that modifies its frames only ever changes its
+    own copy.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._holders = {}
+        self._building = {}
+        self._pending = {}
+
+    def acquire(self, key, loader):
+        """Lease on the entry for key, calling loader() to build it if no one holds it"""
+        with self._lock:
+            build_lock = self._building.setdefault(key, threading.Lock())
+            self._pending[key] = self._pending.get(key, 0) + 1
+
+        # Concurrent sessions asking for the same new dataset wait for one build
+        try:
+            with build_lock:
+                with self._lock:
+                    entry = self._entries.get(key)
+                if entry is None:
+                    entry = loader()
+                with self._lock:
+                    self._entries.setdefault(key, entry)
+                    self._holders[key] = self._holders.get(key, 0) + 1
+                    entry = self._entries[key]
+        finally:
+            with self._lock:
+                pending = self._pending.pop(key) - 1
+                if pending:
+                    self._pending[key] = pending
+                elif key not in self._entries:
+                    # The build failed and no one else is waiting for it
+                    self._building.pop(key, None)
+
+        frames = {name: value.copy(deep=False) if isinstance(value, pd.DataFrame) else value
+                  for name, value in entry.items()}
+        lease = DatasetLease(key, frames)
+        weakref.finalize(lease, self._release, key)
+        return lease
+
+    def _release(self, key):
+        with self._lock:
+            holders = self._holders.get(key, 0) - 1
+            if holders > 0:
+                self._holders[key] = holders
+                return
+            self._holders.pop(key, None)
+            self._entries.pop(key, None)
+            # Sessions already waiting on the build lock must keep sharing it
+            if key not in self._pending:
+                self._building.pop(key, None)
+
+    def stats(self):
+        """Holders and in-memory size of every live entry"""
+        with self._lock:
+            entries = list(self._entries.items())
+            holders = dict(self._holders)
+        rows = []
+        for key, entry in entries:
+            frames = [value for value in entry.values() if isinstance(value, pd.DataFrame)]
+            rows.append({
+                'Dataset': key,
+                'Sessions': holders.get(key, 0),
+                'Memory (MB)': round(sum(frame.memory_usage(deep=True).sum() for frame in frames) / 1024 ** 2, 2),
+            })
+        return pd.DataFrame(rows, columns=['Dataset', 'Sessions', 'Memory (MB)'])
@@ -0,0 +1,56 @@
+import numpy as np
+
+
+def _numeric(values):
+    """Float x positions for numbers, datetimes or anything else (by position)"""
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[ns]').astype(np.int64).astype(np.float64)
+    if np.issubdtype(values.dtype, np.number):
+        return values.astype(np.float64)
+    return np.arange(len(values), dtype=np.float64)
+
+
+def lttb_indices(x, y, threshold, keep_extremes=True):
+    """Positions of the points Largest-Triangle-Three-Buckets keeps out of a series.
+
+    The first and last points are always kept and every bucket in between
+    contributes the point forming the largest triangle with its neighbours,
+    which preserves the visual shape. With keep_extremes the overall maximum
+    and minimum are added back if LTTB dropped them, so the result may hold
+    up to two points more than threshold.
+    """
+    x = _numeric(x)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if threshold < 3 or n <= threshold:
+        return np.arange(n)
+
+    # threshold - 2 buckets over the inner points, then the last point as a bucket of its own
+    edges = np.append(np.linspace(1, n - 1, threshold - 1).astype(np.int64), n)
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+
+    anchor = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end = edges[bucket + 2]
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+
+        area = np.abs((x[anchor] - next_x) * (y[start:end] - y[anchor])
+                      - (x[anchor] - x[start:end]) * (next_y - y[anchor]))
+        anchor = start + int(np.argmax(area))
+        keep[bucket + 1] = anchor
+
+    if keep_extremes:
+        keep = np.union1d(keep, [int(np.argmax(y)), int(np.argmin(y))])
+    return keep
+
+
+def downsample(frame, x, y, threshold, keep_extremes=True):
+    """Rows of frame (sorted along x) reduced to about threshold points with LTTB"""
+    if len(frame) <= threshold:
+        return frame
+    positions = lttb_indices(frame[x].to_numpy(), frame[y].to_numpy(), threshold, keep_extremes)
+    return frame.iloc[positions]
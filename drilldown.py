@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+from cube import CUBE_MEASURES
+from filter_index import FilterIndex
+from incremental import merge_cells
+from schema import with_unknown
+
+# Week columns shared by every drill level, as in the weekly trend table
+WEEK_KEYS = ['Fiscal_Year', 'Fiscal_Week_Start', 'Fiscal_Week_Str', 'Week_Number', 'Week_Label']
+FAMILY_KEYS = ['Name', 'Family'] + WEEK_KEYS
+ITEM_KEYS = ['Name', 'Family', 'Item No', 'Description'] + WEEK_KEYS
+
+# Each level is sorted customer first, so one customer's rows are a contiguous slice
+FAMILY_COLUMNS = ['Name', 'Family', 'Fiscal_Year']
+ITEM_COLUMNS = ['Name', 'Family', 'Item No', 'Fiscal_Year']
+
+OTHER_FAMILY = 'Other'
+
+
+def product_family(items):
+    """Family prefix of each item number ('BCH-10023' -> 'BCH'), as a categorical"""
+    items = items.astype('category')
+    categories = items.cat.categories.astype(str)
+    # Only the distinct item numbers are parsed, then mapped through the codes
+    prefixes = np.where(categories.str.contains('-', regex=False),
+                        categories.str.split('-', n=1).str[0].str.strip(), OTHER_FAMILY)
+    prefixes = np.where(prefixes == '', OTHER_FAMILY, prefixes)
+    families = pd.Categorical(prefixes)
+    # A trailing -1 lets missing item numbers (code -1) map to a missing family
+    family_codes = np.append(families.codes, -1)
+    codes = family_codes[items.cat.codes.to_numpy()]
+    return pd.Series(pd.Categorical.from_codes(codes, families.categories), index=items.index)
+
+
+def build_item_cube(df):
+    """Pre-aggregate a prepared ledger to one row per customer, item and fiscal week"""
+    items = df[['Name', 'Item No', 'Description'] + WEEK_KEYS + ['Abs_Sales', 'Invoiced Quantity']]
+    # Rows without a customer, item number or description are drilled under UNKNOWN_LABEL
+    items = items.assign(**{column: with_unknown(df[column]) for column in ['Name', 'Item No', 'Description']})
+    items = items.assign(Family=product_family(items['Item No']))
+    # dropna=False keeps every ledger row, so drilled totals always match the cube
+    return items.groupby(ITEM_KEYS, as_index=False, observed=True, sort=False, dropna=False).agg(
+        Abs_Sales=('Abs_Sales', 'sum'),
+        Quantity=('Invoiced Quantity', 'sum')
+    )
+
+
+def _selected(value, cast=None):
+    if value is None or value == "All":
+        return None
+    return cast(value) if cast else value
+
+
+class Drilldown:
+    """Customer -> product family -> item hierarchy over weekly aggregates.
+
+    The family x week level is rolled up once from the item x week cube and
+    both levels are held in a FilterIndex, so every drill step is a posting
+    list lookup followed by a sum over the (small) selected slice.
+    """
+
+    def __init__(self, item_cube):
+        family_cube = item_cube.groupby(FAMILY_KEYS, as_index=False, observed=True,
+                                       dropna=False)[CUBE_MEASURES].sum()
+        self.families = FilterIndex(family_cube, columns=FAMILY_COLUMNS,
+                                    sort_columns=FAMILY_COLUMNS + ['Fiscal_Week_Start'])
+        self.items = FilterIndex(item_cube, columns=ITEM_COLUMNS,
+                                 sort_columns=ITEM_COLUMNS + ['Fiscal_Week_Start'])
+
+    @classmethod
+    def from_prepared(cls, df):
+        return cls(build_item_cube(df))
+
+    def appended(self, new_rows):
+        """Drilldown with appended ledger rows merged in, re-aggregating only the weeks they touch"""
+        return Drilldown(merge_cells(self.items.frame, build_item_cube(new_rows), ITEM_KEYS, dropna=False))
+
+    def _select(self, customer, family, item, fiscal_year):
+        filters = {'Name': _selected(customer), 'Family': _selected(family),
+                   'Fiscal_Year': _selected(fiscal_year, int)}
+        if _selected(item) is not None:
+            return self.items.select(**filters, **{'Item No': item})
+        return self.families.select(**filters)
+
+    def family_names(self, customer=None, fiscal_year=None):
+        rows = self._select(customer, None, None, fiscal_year)
+        return sorted(rows['Family'].unique().tolist())
+
+    def item_names(self, customer=None, family=None, fiscal_year=None):
+        rows = self.items.select(Name=_selected(customer), Family=_selected(family),
+                                 Fiscal_Year=_selected(fiscal_year, int))
+        return sorted(rows['Item No'].unique().tolist())
+
+    def breakdown(self, customer=None, family=None, fiscal_year=None, top=None):
+        """Sales per family (or per item within a family), largest first"""
+        if _selected(family) is None:
+            rows, keys = self._select(customer, None, None, fiscal_year), ['Family']
+        else:
+            rows = self.items.select(Name=_selected(customer), Family=family,
+                                     Fiscal_Year=_selected(fiscal_year, int))
+            keys = ['Item No', 'Description']
+        table = rows.groupby(keys, as_index=False, observed=True, dropna=False)[CUBE_MEASURES].sum()
+        table = table.sort_values('Abs_Sales', ascending=False)
+        return table.head(top) if top else table
+
+    def weekly(self, customer=None, family=None, item=None, fiscal_year=None):
+        """Weekly sales of a customer's family or single item (All for the whole level)"""
+        rows = self._select(customer, family, item, fiscal_year)
+        keys = ['Fiscal_Week_Str', 'Week_Number', 'Fiscal_Week_Start', 'Week_Label']
+        table = rows.groupby(keys, as_index=False, observed=True, dropna=False)[CUBE_MEASURES].sum()
+        return table.sort_values('Fiscal_Week_Start')
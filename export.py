@@ -0,0 +1,296 @@
+"""Export every customer's weekly, monthly and yearly summaries in one pass.
+
+The aggregate cube is sorted by customer once and walked in slices of whole
+customers; each slice is rolled up for all three views and appended to the
+output straight away, so only one slice of summaries is ever in memory:
+
+* xlsx: an openpyxl write-only workbook with one sheet per view (continued
+  on further sheets past Excel's row limit);
+* parquet / csv: one file per view written batch by batch, then zipped.
+
+Static chart images are rendered with matplotlib across a process pool and
+zipped as they come back.
+"""
+import hashlib
+import io
+import os
+import re
+import tempfile
+import zipfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from cube import rollup
+from filter_index import FilterIndex
+from trend_tables import (SEASON_COLORS, TREND_VIEWS, summary_table,
+                          weekly_trend_table, monthly_trend_table, yearly_trend_table)
+
+EXPORT_FORMATS = ('xlsx', 'parquet', 'csv')
+EXPORT_SUFFIXES = {'xlsx': '.xlsx', 'parquet': '.parquet.zip', 'csv': '.csv.zip'}
+
+# Cube rows rolled up per slice; a customer is never split across slices
+EXPORT_BATCH_ROWS = 200_000
+XLSX_MAX_ROWS = 1_048_576
+MAX_CHART_WORKERS = os.cpu_count() or 1
+
+# Set in each worker by init_worker so the cube is shipped once per process, not per task
+_worker_index = None
+
+
+def _hashed(stem, customer):
+    return f"{stem}-{hashlib.sha1(customer.encode('utf-8')).hexdigest()[:8]}"
+
+
+def file_stem(customer):
+    """File-name-safe stem for a customer, with a short hash of the name whenever it had to be changed.
+
+    'A & B' and 'A B' both clean up to 'A_B', so the hash keeps their files apart.
+    """
+    stem = re.sub(r'[^A-Za-z0-9_-]+', '_', customer).strip('_') or 'customer'
+    return stem if stem == customer else _hashed(stem, customer)
+
+
+def unique_stems(customers):
+    """{customer: stem} for the distinct customers, also hashing stems that only differ by case"""
+    stems = {customer: file_stem(customer) for customer in dict.fromkeys(customers)}
+    # 'Acme' and 'ACME' are the same file on case-insensitive file systems
+    folded = Counter(stem.casefold() for stem in stems.values())
+    return {customer: _hashed(stem, customer) if folded[stem.casefold()] > 1 and stem == customer else stem
+            for customer, stem in stems.items()}
+
+
+def customer_batches(cube, batch_rows=EXPORT_BATCH_ROWS):
+    """Slices of the cube holding whole customers, in customer order, of about batch_rows rows each"""
+    if cube.empty:
+        return
+    codes, _ = pd.factorize(cube['Name'], sort=True)
+    order = np.argsort(codes, kind='stable')
+    codes = codes[order]
+
+    # Cut only where the customer changes, at the first boundary past each batch_rows
+    starts = np.flatnonzero(np.diff(codes)) + 1
+    cuts, limit = [0], batch_rows
+    for start in starts:
+        if start >= limit:
+            cuts.append(start)
+            limit = start + batch_rows
+    cuts.append(len(codes))
+
+    for begin, end in zip(cuts[:-1], cuts[1:]):
+        yield cube.take(order[begin:end])
+
+
+def customer_summaries(batch):
+    """Summary table of every view for every customer in a slice of the cube"""
+    summaries = {}
+    for view, (keys, sort_by) in TREND_VIEWS.items():
+        table = rollup(batch, ['Name'] + keys).sort_values(['Name'] + sort_by)
+        summary = summary_table(table, view)
+        # Categories differ from slice to slice, so the files get plain values
+        for column in summary.columns:
+            if isinstance(summary[column].dtype, pd.CategoricalDtype):
+                summary[column] = summary[column].astype(str)
+        summaries[view] = summary
+    return summaries
+
+
+class _XlsxSink:
+    """Write-only workbook with a sheet per view; rows are flushed to disk as they are appended"""
+
+    def __init__(self, target):
+        from openpyxl import Workbook
+
+        self.target = target
+        self.workbook = Workbook(write_only=True)
+        self.sheets = {}
+        self.rows = {}
+        self.parts = {}
+
+    def _new_sheet(self, view, columns):
+        part = self.parts.get(view, 0) + 1
+        self.parts[view] = part
+        self.sheets[view] = self.workbook.create_sheet(view.title() if part == 1 else f"{view.title()} {part}")
+        self.sheets[view].append(list(columns))
+        self.rows[view] = 1
+
+    def write(self, view, summary):
+        if view not in self.sheets:
+            self._new_sheet(view, summary.columns)
+        for row in summary.itertuples(index=False, name=None):
+            if self.rows[view] >= XLSX_MAX_ROWS:
+                self._new_sheet(view, summary.columns)
+            self.sheets[view].append(row)
+            self.rows[view] += 1
+
+    def close(self):
+        if not self.sheets:
+            self.workbook.create_sheet('Summary')
+        self.workbook.save(self.target)
+
+
+class _ZipSink:
+    """One Parquet or CSV file per view, appended batch by batch in a scratch directory and zipped on close"""
+
+    def __init__(self, target, table_format):
+        self.target = target
+        self.table_format = table_format
+        self.scratch = tempfile.TemporaryDirectory(prefix='sales-export-')
+        self.files = {}
+        self.writers = {}
+
+    def write(self, view, summary):
+        path = self.files.setdefault(view, Path(self.scratch.name) / f"{view}.{self.table_format}")
+        if self.table_format == 'csv':
+            summary.to_csv(path, mode='a', header=view not in self.writers, index=False)
+            self.writers[view] = None
+            return
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(summary, preserve_index=False)
+        if view not in self.writers:
+            self.writers[view] = pq.ParquetWriter(path, table.schema)
+        self.writers[view].write_table(table.cast(self.writers[view].schema))
+
+    def close(self):
+        for writer in self.writers.values():
+            if writer is not None:
+                writer.close()
+        # Parquet is already compressed, so it is only stored
+        compression = zipfile.ZIP_STORED if self.table_format == 'parquet' else zipfile.ZIP_DEFLATED
+        with zipfile.ZipFile(self.target, 'w', compression) as archive:
+            for view, path in self.files.items():
+                archive.write(path, path.name)
+        self.scratch.cleanup()
+
+
+def export_summaries(cube, target, export_format='xlsx', batch_rows=EXPORT_BATCH_ROWS):
+    """Write every customer's weekly, monthly and yearly summaries to target (a path or binary file).
+
+    Returns the number of rows written per view.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {export_format!r}; expected one of {', '.join(EXPORT_FORMATS)}")
+    frame = cube.frame if isinstance(cube, FilterIndex) else cube
+
+    sink = _XlsxSink(target) if export_format == 'xlsx' else _ZipSink(target, export_format)
+    written = dict.fromkeys(TREND_VIEWS, 0)
+    for batch in customer_batches(frame, batch_rows):
+        for view, summary in customer_summaries(batch).items():
+            sink.write(view, summary)
+            written[view] += len(summary)
+    sink.close()
+    return written
+
+
+def render_charts(tables, customer):
+    """PNG bytes of the weekly, monthly and yearly charts for one customer's trend tables"""
+    # matplotlib only ever renders off-screen here
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    weekly, monthly, yearly = tables['weekly'], tables['monthly'], tables['yearly']
+    charts = {}
+
+    def _png(fig):
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', bbox_inches='tight')
+        plt.close(fig)
+        return buffer.getvalue()
+
+    if not weekly.empty:
+        fig, ax = plt.subplots(figsize=(12, 4))
+        ax.plot(weekly['Fiscal_Week_Start'], weekly['Abs_Sales'], marker='o', linewidth=2)
+        ax.set_title(f"Weekly Sales Trend (Friday to Thursday) - {customer}")
+        ax.set_xlabel('Week Starting')
+        ax.set_ylabel('Sales Amount')
+        fig.autofmt_xdate()
+        charts['weekly'] = _png(fig)
+
+    if not monthly.empty:
+        fig, ax = plt.subplots(figsize=(12, 4))
+        ax.bar(monthly['Month'].astype(str), monthly['Abs_Sales'],
+               color=[SEASON_COLORS[season] for season in monthly['Season']])
+        ax.set_title(f"Monthly Sales Trend with Seasonal Classification - {customer}")
+        ax.set_ylabel('Sales Amount')
+        ax.tick_params(axis='x', rotation=45)
+        charts['monthly'] = _png(fig)
+
+    if not yearly.empty:
+        fig, ax = plt.subplots(figsize=(12, 4))
+        for fiscal_year, rows in yearly.groupby('Fiscal_Year'):
+            ax.plot(rows['Month'].astype(str), rows['Abs_Sales'], marker='o', label=f"FY {fiscal_year}")
+        ax.axhline(yearly['Abs_Sales'].mean(), linestyle=':', color='grey')
+        ax.set_title(f"Yearly Trend by Month (Fiscal Year: July-June) - {customer}")
+        ax.set_ylabel('Sales Amount')
+        ax.legend()
+        ax.tick_params(axis='x', rotation=45)
+        charts['yearly'] = _png(fig)
+
+    return charts
+
+
+def customer_tables(cube, customer):
+    """{view: trend table} for one customer, from the cube or its FilterIndex"""
+    return {
+        'weekly': weekly_trend_table(cube, customer),
+        'monthly': monthly_trend_table(cube, customer),
+        'yearly': yearly_trend_table(cube, customer),
+    }
+
+
+def customer_charts(cube, customer):
+    """(customer, {view: PNG bytes}) rendered from the cube or its FilterIndex"""
+    return customer, render_charts(customer_tables(cube, customer), customer)
+
+
+def init_worker(cube):
+    """Process pool initializer indexing the cube once in each worker (see worker_index)"""
+    global _worker_index
+    _worker_index = FilterIndex(cube)
+
+
+def worker_index():
+    return _worker_index
+
+
+def _worker_charts(customer):
+    return customer_charts(worker_index(), customer)
+
+
+def export_charts(cube, customers, target, workers=MAX_CHART_WORKERS):
+    """Zip of every customer's chart PNGs, rendered across a process pool when workers > 1.
+
+    Images are added to the archive as each customer finishes. Returns the number of images written.
+    """
+    frame = cube.frame if isinstance(cube, FilterIndex) else cube
+    stems = unique_stems(customers)
+    workers = min(workers, len(stems))
+    entries = set()
+    with zipfile.ZipFile(target, 'w', zipfile.ZIP_STORED) as archive:
+        def _add(customer, charts):
+            for view, png in charts.items():
+                name = f"{stems[customer]}_{view}.png"
+                # zipfile only warns about duplicates, and readers then see just one of them
+                if name in entries:
+                    raise ValueError(f"Duplicate chart entry {name!r} for customer {customer!r}")
+                entries.add(name)
+                archive.writestr(name, png)
+
+        if workers <= 1:
+            index = cube if isinstance(cube, FilterIndex) else FilterIndex(frame)
+            for customer in stems:
+                _add(*customer_charts(index, customer))
+            return len(entries)
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(frame,)) as pool:
+            futures = [pool.submit(_worker_charts, customer) for customer in stems]
+            for future in as_completed(futures):
+                _add(*future.result())
+    return len(entries)
@@ -0,0 +1,96 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Filterable columns, in the order the indexed frame is sorted by. Sorting by
+# customer first makes the common single-customer selection a contiguous slice.
+FILTER_COLUMNS = ['Name', 'Fiscal_Year', 'Year', 'Month']
+SORT_COLUMNS = ['Name', 'Fiscal_Year', 'Year', 'Month_Num']
+
+EMPTY_POSITIONS = np.array([], dtype=np.int64)
+
+
+def _postings(column):
+    """Map each distinct value of a column to the sorted row positions holding it"""
+    codes, uniques = pd.factorize(column)
+    if not len(codes):
+        return {}
+    order = np.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    groups = np.split(order.astype(np.int64), starts[1:])
+    return {
+        uniques[sorted_codes[start]]: group
+        for start, group in zip(starts, groups)
+        if sorted_codes[start] >= 0
+    }
+
+
+class FilterIndex:
+    """Inverted index over the filter columns of a frame, with an LRU of recent selections.
+
+    One index is shared by every session's script thread, so the LRU is only
+    touched under a lock; selections themselves are computed outside it.
+    """
+
+    def __init__(self, df, cache_size=32, columns=FILTER_COLUMNS, sort_columns=SORT_COLUMNS):
+        sort_columns = [column for column in sort_columns if column in df.columns]
+        self.frame = df.sort_values(sort_columns, kind='stable').reset_index(drop=True)
+        self.postings = {
+            column: _postings(self.frame[column])
+            for column in columns if column in self.frame.columns
+        }
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def clear_cache(self):
+        with self._cache_lock:
+            self._cache.clear()
+
+    def positions(self, filters):
+        """Sorted row positions matching every filter, or None when nothing is filtered"""
+        matches = []
+        for column, value in filters.items():
+            if value is None:
+                continue
+            positions = self.postings[column].get(value)
+            if positions is None:
+                return EMPTY_POSITIONS
+            matches.append(positions)
+
+        if not matches:
+            return None
+
+        # Intersect smallest first so every step works on the shortest array
+        matches.sort(key=len)
+        result = matches[0]
+        for positions in matches[1:]:
+            result = np.intersect1d(result, positions, assume_unique=True)
+        return result
+
+    def select(self, **filters):
+        """Rows matching column=value filters (None means unfiltered)"""
+        key = tuple(sorted(filters.items()))
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        positions = self.positions(filters)
+        if positions is None:
+            result = self.frame
+        elif len(positions) and positions[-1] - positions[0] + 1 == len(positions):
+            # Contiguous selections are sliced, which does not copy the rows
+            result = self.frame.iloc[positions[0]:positions[-1] + 1]
+        else:
+            result = self.frame.take(positions)
+
+        with self._cache_lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
@@ -0,0 +1,121 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Fiscal Year: July to June | Week: Friday to Thursday
+FISCAL_YEAR_START_MONTH = 7
+MAX_WEEK_NUMBER = 53
+
+MONTH_NAMES = np.array([
+    'January', 'February', 'March', 'April', 'May', 'June',
+    'July', 'August', 'September', 'October', 'November', 'December'
+], dtype=object)
+
+SEASON_BY_MONTH = {
+    11: "High Season", 12: "High Season", 1: "High Season",
+    6: "Low Season", 7: "Low Season", 8: "Low Season"
+}
+DEFAULT_SEASON = "Moderate Season"
+SEASON_NAMES = np.array([SEASON_BY_MONTH.get(m, DEFAULT_SEASON) for m in range(1, 13)], dtype=object)
+
+
+def _to_days(dates):
+    # datetime64[D] keeps all the arithmetic below in plain int64 day counts
+    return pd.to_datetime(pd.Series(dates)).to_numpy(dtype='datetime64[ns]').astype('datetime64[D]')
+
+
+def _weekday(days):
+    # 1970-01-01 was a Thursday (weekday 3), numpy's % is always non-negative
+    return (days.astype(np.int64) + 3) % 7
+
+
+def calendar_year(days):
+    return days.astype('datetime64[Y]').astype(np.int64) + 1970
+
+
+def month_number(days):
+    return days.astype('datetime64[M]').astype(np.int64) % 12 + 1
+
+
+def fiscal_year(days):
+    years = calendar_year(days)
+    return np.where(month_number(days) >= FISCAL_YEAR_START_MONTH, years, years - 1)
+
+
+def days_since_friday(days):
+    return (_weekday(days) + 3) % 7
+
+
+def first_friday(fiscal_years):
+    """Friday anchoring week 1: on/after 1 July, or the Friday before when 1 July is a weekend"""
+    months = (np.asarray(fiscal_years, dtype=np.int64) - 1970) * 12 + FISCAL_YEAR_START_MONTH - 1
+    fiscal_start = months.astype('datetime64[M]').astype('datetime64[D]')
+    # Mon-Fri roll forward to Friday, Sat/Sun roll back - both are start + (4 - weekday)
+    return fiscal_start + (4 - _weekday(fiscal_start))
+
+
+def fiscal_week_number(days, fiscal_years=None):
+    if fiscal_years is None:
+        fiscal_years = fiscal_year(days)
+    week_start = days - days_since_friday(days)
+    offset = (week_start - first_friday(fiscal_years)).astype(np.int64)
+    week_numbers = np.where(offset >= 0, offset // 7 + 1, 1)
+    return np.minimum(week_numbers, MAX_WEEK_NUMBER)
+
+
+def fiscal_calendar(dates):
+    """Fiscal calendar columns for a whole column of dates in one vectorized pass"""
+    dates = pd.to_datetime(pd.Series(dates))
+    days = _to_days(dates)
+    fiscal_years = fiscal_year(days)
+    offsets = days_since_friday(days)
+    month_nums = month_number(days)
+
+    return pd.DataFrame({
+        'Fiscal_Year': fiscal_years,
+        'Weekday': _weekday(days),
+        # Subtract from the full timestamp so the week start matches the row-wise version exactly
+        'Fiscal_Week_Start': dates.to_numpy(dtype='datetime64[ns]') - offsets.astype('timedelta64[D]'),
+        'Week_Number': fiscal_week_number(days, fiscal_years),
+        'Month': MONTH_NAMES[month_nums - 1],
+        'Month_Num': month_nums,
+        'Year': calendar_year(days),
+    }, index=dates.index)
+
+
+def date_keys(dates):
+    """Integer date key (days since 1970-01-01) used to join rows onto the calendar table"""
+    return _to_days(dates).astype(np.int64)
+
+
+@lru_cache(maxsize=32)
+def calendar_table(first_key, last_key):
+    """One row per day between two date keys with every derived calendar field.
+
+    The table is shared between callers through the cache, so treat it as read-only.
+    """
+    days = np.arange(first_key, last_key + 1, dtype=np.int64).astype('datetime64[D]')
+    table = fiscal_calendar(days.astype('datetime64[ns]'))
+    table.insert(0, 'Date_Key', np.arange(first_key, last_key + 1, dtype=np.int64))
+
+    # String formatting happens once per calendar day instead of once per ledger row
+    table['Fiscal_Week_Str'] = table['Fiscal_Week_Start'].dt.strftime('%Y-%m-%d')
+    table['Week_Label'] = ('Week ' + table['Week_Number'].astype(str) + '<br>'
+                           + table['Fiscal_Week_Start'].dt.strftime('%b %d'))
+    table['Season'] = SEASON_NAMES[table['Month_Num'].to_numpy() - 1]
+    return table
+
+
+def attach_calendar(df, date_column='Date'):
+    """Join the calendar table onto a ledger through the integer date key"""
+    keys = date_keys(df[date_column])
+    first_key = int(keys.min()) if len(keys) else 0
+    last_key = int(keys.max()) if len(keys) else -1
+    table = calendar_table(first_key, last_key)
+
+    # Keys are dense within the table, so the join is a positional take
+    joined = table.take(keys - first_key)
+    joined.index = df.index
+    # Fiscal_Week_Start from the table is the midnight of the Friday, not the row's timestamp
+    return pd.concat([df.drop(columns=joined.columns, errors='ignore'), joined], axis=1)
@@ -0,0 +1,150 @@
+"""Next-quarter weekly sales forecasts for every customer at once.
+
+Every customer's weekly sales become one column of a (week x customer)
+matrix and all columns share the same design matrix: a linear trend,
+Fourier terms of the fiscal week number and one-hot seasons. A single
+multi-output Ridge regression per batch of columns therefore fits every
+customer in one solve, and batches are spread over a capped process pool.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import Ridge
+
+from cube import rollup
+from fiscal_calendar import SEASON_NAMES, calendar_table
+from trend_tables import classify_season
+
+# Bump when the features or model change, so cached models are refitted
+FORECAST_VERSION = 1
+
+FORECAST_WEEKS = 13
+TRAINING_WEEKS = 156
+FOURIER_TERMS = 3
+RIDGE_ALPHA = 1.0
+
+# Customers per Ridge fit; the pool is only used when there is more than one batch
+BATCH_SERIES = 500
+MAX_FORECAST_WORKERS = min(4, os.cpu_count() or 1)
+
+SEASONS = sorted(set(SEASON_NAMES))
+TOTAL_SERIES = 'All'
+
+
+def _week_calendar(first_day, weeks):
+    """Calendar rows (fiscal week, season, labels) for consecutive weeks starting on first_day"""
+    days = first_day + 7 * np.arange(weeks, dtype=np.int64)
+    table = calendar_table(int(days[0]), int(days[-1]))
+    return table.take(days - days[0]).reset_index(drop=True)
+
+
+def design_matrix(first_day, origin_day, weeks):
+    """Trend, fiscal-week Fourier terms and season indicators for consecutive weeks"""
+    calendar = _week_calendar(first_day, weeks)
+    trend = (first_day - origin_day) / 7 + np.arange(weeks)
+    phase = 2 * np.pi * calendar['Week_Number'].to_numpy(dtype=np.float64) / 52.18
+
+    columns = {'trend': trend / 52}
+    for term in range(1, FOURIER_TERMS + 1):
+        columns[f'sin_{term}'] = np.sin(term * phase)
+        columns[f'cos_{term}'] = np.cos(term * phase)
+    seasons = calendar['Month_Num'].map(classify_season).to_numpy()
+    for season in SEASONS:
+        columns[f'season_{season}'] = (seasons == season).astype(np.float64)
+    return pd.DataFrame(columns), calendar
+
+
+def _fit_block(features, targets, alpha):
+    """Fit one multi-output Ridge over a block of series; returns coefficients, intercepts and residual sigma"""
+    model = Ridge(alpha=alpha).fit(features, targets)
+    residuals = targets - model.predict(features)
+    dof = max(len(features) - features.shape[1] - 1, 1)
+    sigma = np.sqrt((residuals ** 2).sum(axis=0) / dof)
+    return model.coef_.reshape(targets.shape[1], -1), np.atleast_1d(model.intercept_), sigma
+
+
+def weekly_matrix(cube, training_weeks=TRAINING_WEEKS, measure='Abs_Sales'):
+    """Dense (week x series) sales matrix of the last training_weeks weeks, with the total as a last column"""
+    pieces = rollup(cube, ['Name', 'Fiscal_Week_Start'])
+    if pieces.empty:
+        raise ValueError("No weekly sales to fit a forecast on")
+    names, uniques = pd.factorize(pieces['Name'])
+    days = pieces['Fiscal_Week_Start'].to_numpy(dtype='datetime64[D]').astype(np.int64)
+    last_day = days.max()
+    first_day = max(days.min(), last_day - 7 * (training_weeks - 1))
+    weeks = (days - first_day) // 7
+    keep = weeks >= 0
+
+    n_weeks, n_series = (last_day - first_day) // 7 + 1, len(uniques)
+    matrix = np.zeros((n_weeks, n_series))
+    np.add.at(matrix, (weeks[keep], names[keep]), pieces[measure].to_numpy(dtype=np.float64)[keep])
+    matrix = np.column_stack([matrix, matrix.sum(axis=1)])
+    return matrix, [str(name) for name in uniques] + [TOTAL_SERIES], int(first_day)
+
+
+class WeeklyForecaster:
+    """Seasonal Ridge models for every customer's weekly sales (plus the all-customer total)"""
+
+    def __init__(self, names, coefficients, intercepts, sigma, first_day, last_day):
+        self.names = list(names)
+        self.positions = {name: position for position, name in enumerate(self.names)}
+        self.coefficients = np.asarray(coefficients, dtype=np.float64)
+        self.intercepts = np.asarray(intercepts, dtype=np.float64)
+        self.sigma = np.asarray(sigma, dtype=np.float64)
+        self.first_day = int(first_day)
+        self.last_day = int(last_day)
+
+    @classmethod
+    def fit(cls, cube, training_weeks=TRAINING_WEEKS, alpha=RIDGE_ALPHA, workers=MAX_FORECAST_WORKERS):
+        """Fit every series of the cube, one Ridge solve per batch of BATCH_SERIES columns"""
+        matrix, names, first_day = weekly_matrix(cube, training_weeks)
+        features, _ = design_matrix(first_day, first_day, len(matrix))
+        features = features.to_numpy()
+
+        blocks = np.array_split(np.arange(matrix.shape[1]), max(1, -(-matrix.shape[1] // BATCH_SERIES)))
+        workers = min(workers, MAX_FORECAST_WORKERS, len(blocks))
+        if workers <= 1:
+            fitted = [_fit_block(features, matrix[:, block], alpha) for block in blocks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(_fit_block, features, matrix[:, block], alpha) for block in blocks]
+                fitted = [future.result() for future in futures]
+
+        coefficients, intercepts, sigma = (np.concatenate(parts) for parts in zip(*fitted))
+        return cls(names, coefficients, intercepts, sigma, first_day, first_day + 7 * (len(matrix) - 1))
+
+    def forecast(self, customer=TOTAL_SERIES, horizon=FORECAST_WEEKS, confidence=0.95):
+        """Forecast and confidence band for the weeks after the last observed week, or None if unknown"""
+        position = self.positions.get(TOTAL_SERIES if customer in (None, "All") else customer)
+        if position is None:
+            return None
+
+        features, calendar = design_matrix(self.last_day + 7, self.first_day, horizon)
+        predicted = features.to_numpy() @ self.coefficients[position] + self.intercepts[position]
+        margin = NormalDist().inv_cdf(0.5 + confidence / 2) * self.sigma[position]
+
+        # Sales amounts are never negative, so neither is the forecast or its band
+        forecast = calendar[['Fiscal_Year', 'Week_Number', 'Fiscal_Week_Start', 'Fiscal_Week_Str', 'Week_Label']].copy()
+        forecast['Forecast'] = np.clip(predicted, 0, None)
+        forecast['Lower'] = np.clip(predicted - margin, 0, None)
+        forecast['Upper'] = np.clip(predicted + margin, 0, None)
+        return forecast
+
+    def to_frames(self):
+        """Frames for the dataset cache; from_frames rebuilds the forecaster"""
+        models = pd.DataFrame(self.coefficients, columns=[f'coef_{i}' for i in range(self.coefficients.shape[1])])
+        models.insert(0, 'Name', self.names)
+        models['intercept'] = self.intercepts
+        models['sigma'] = self.sigma
+        meta = pd.DataFrame({'first_day': [self.first_day], 'last_day': [self.last_day]})
+        return {'forecast_models': models, 'forecast_meta': meta}
+
+    @classmethod
+    def from_frames(cls, frames):
+        models, meta = frames['forecast_models'], frames['forecast_meta'].iloc[0]
+        coefficients = models[[column for column in models.columns if column.startswith('coef_')]]
+        return cls(models['Name'], coefficients, models['intercept'], models['sigma'],
+                   meta['first_day'], meta['last_day'])
@@ -0,0 +1,119 @@
+import pandas as pd
+
+from cube import CUBE_KEYS, CUBE_MEASURES, build_cube
+from preparation import invalid_dates, prepare_ledger
+from schema import summed_baseline
+
+# A posting already in the store is recognised by these columns
+DEDUP_COLUMNS = ['Date_Key', 'Item No', 'Source No', 'Sales Amount']
+
+# Cube cells an append touched; cached views outside them are still valid
+TOUCHED_COLUMNS = ['Name', 'Fiscal_Year', 'Year', 'Month', 'Fiscal_Week_Start']
+
+
+def _align_categories(existing, new):
+    """Give new's categorical columns the existing dtype, extending it where needed.
+
+    Categories are only appended, so the existing codes stay valid and the
+    large frame is never re-encoded. Both frames are shallow copies, so under
+    copy-on-write neither caller's frame is modified or duplicated.
+    """
+    existing, new = existing.copy(deep=False), new.copy(deep=False)
+    for column in existing.columns:
+        if column not in new.columns or not isinstance(existing[column].dtype, pd.CategoricalDtype):
+            continue
+        categories = existing[column].cat.categories
+        extra = pd.Index(new[column].dropna().unique()).difference(categories, sort=False)
+        if len(extra):
+            existing[column] = existing[column].cat.add_categories(extra)
+        new[column] = new[column].astype(existing[column].dtype)
+    return existing, new
+
+
+def _concat(existing, new):
+    existing, new = _align_categories(existing, new)
+    return pd.concat([existing, new], ignore_index=True)
+
+
+def overlapping_rows(prepared, new):
+    """Mask of new rows already present in the prepared ledger"""
+    if prepared is None or prepared.empty or new.empty:
+        return pd.Series(False, index=new.index)
+
+    # Only rows on or after the first new posting date can collide
+    window = prepared[prepared['Date_Key'] >= new['Date_Key'].min()]
+    existing_keys = pd.MultiIndex.from_frame(window[DEDUP_COLUMNS].astype(object))
+    new_keys = pd.MultiIndex.from_frame(new[DEDUP_COLUMNS].astype(object))
+    return pd.Series(new_keys.isin(existing_keys), index=new.index)
+
+
+def touched_cells(new):
+    """Distinct customer, fiscal year, month and week cells holding appended rows"""
+    return new[[column for column in TOUCHED_COLUMNS if column in new.columns]].drop_duplicates()
+
+
+def prepare_rows(prepared, new_rows, earlier=None, on_overlap='drop'):
+    """Prepare a delta's ledger rows, without the postings prepared (or an earlier delta) already holds.
+
+    Overlapping rows are dropped, or rejected with ValueError when
+    on_overlap='raise'. Returns the prepared new rows and the counts of rows
+    added, duplicates dropped and rows with an unreadable Posting Date.
+    """
+    new = prepare_ledger(new_rows)
+    invalid = invalid_dates(new)
+
+    overlap = overlapping_rows(prepared, new) | overlapping_rows(earlier, new)
+    if overlap.any():
+        if on_overlap == 'raise':
+            raise ValueError(f"{int(overlap.sum())} rows overlap postings already in the dataset")
+        new = new[~overlap]
+    return new, {'rows_added': len(new), 'duplicates_dropped': int(overlap.sum()),
+                 'invalid_dates': invalid}
+
+
+def merge_cells(cells, new_cells, keys, dropna=True):
+    """Aggregate cells with new cells added in.
+
+    Only cells in the fiscal weeks the new cells touch are re-aggregated,
+    every other cell is reused as is.
+    """
+    if new_cells.empty:
+        return cells
+    stale = cells['Fiscal_Week_Start'].isin(new_cells['Fiscal_Week_Start'].unique())
+    touched = _concat(cells[stale], new_cells)
+    refreshed = touched.groupby(keys, as_index=False, observed=True, dropna=dropna)[CUBE_MEASURES].sum()
+    return _concat(cells[~stale], refreshed)
+
+
+def merge_rows(prepared, cube, deltas):
+    """Merge already prepared deltas into a prepared ledger and its cube, in one pass however many there are.
+
+    Returns the merged ledger, the merged cube and the new rows combined.
+    """
+    deltas = [delta for delta in deltas if not delta.empty]
+    if not deltas:
+        return prepared, cube, prepared.iloc[:0]
+
+    new = deltas[0]
+    for delta in deltas[1:]:
+        new = _concat(new, delta)
+    keys = [key for key in CUBE_KEYS if key in cube.columns]
+    merged = _concat(prepared, new)
+    merged.attrs['uncompacted_mb'] = summed_baseline([prepared] + deltas)
+    return merged, merge_cells(cube, build_cube(new), keys), new
+
+
+def append_rows(prepared, cube, new_rows, on_overlap='drop'):
+    """Prepare only the new ledger rows and merge them into a prepared ledger and its cube.
+
+    Rows matching an existing posting (date, item, source and amount) are dropped,
+    or rejected with ValueError when on_overlap='raise'. Only cube cells in the
+    fiscal weeks the new rows touch are re-aggregated.
+
+    Returns the merged ledger, the merged cube and a dict describing the append
+    (rows added, duplicates dropped and the touched cells).
+    """
+    new, report = prepare_rows(prepared, new_rows, on_overlap=on_overlap)
+    report['touched'] = touched_cells(new)
+    merged, merged_cube, _ = merge_rows(prepared, cube, [new])
+    return merged, merged_cube, report
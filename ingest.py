@@ -0,0 +1,119 @@
+"""Load many ledger files and workbook sheets into one prepared frame.
+
+Every sheet of every workbook (and every CSV/Parquet/Arrow file) is read,
+validated and prepared on its own, across a process pool since openpyxl
+parsing is CPU-bound, and the prepared parts are concatenated with their
+categories unified so the result keeps the compact schema.
+"""
+import io
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from data_loader import (EXCEL_CACHE_DIR, EXCEL_SUFFIXES, REQUIRED_COLUMNS,
+                         excel_sheet_names, load_ledger, read_excel_ledger, source_digest)
+from preparation import invalid_dates, prepare_ledger
+from schema import summed_baseline
+from trend_tables import validate_data_structure
+
+MAX_INGEST_WORKERS = os.cpu_count() or 1
+
+
+def _named_bytes(name, content):
+    # load_ledger picks the reader from the name's suffix
+    buffer = io.BytesIO(content)
+    buffer.name = name
+    return buffer
+
+
+def ledger_parts(sources, spool_dir):
+    """(label, source, sheet, digest) for every sheet of every workbook and every other ledger file.
+
+    Workbooks are hashed once here and uploaded ones are written to spool_dir,
+    so each sheet's task carries a path and the digest instead of the whole
+    workbook. Other uploads are turned into (name, bytes) pairs for the workers.
+    """
+    parts = []
+    for source in sources:
+        local = isinstance(source, (str, Path))
+        name = Path(source).name if local else source.name
+        suffix = Path(name).suffix.lower()
+
+        if suffix in EXCEL_SUFFIXES:
+            digest = source_digest(source)
+            if not local:
+                spooled = Path(spool_dir) / f"{digest}{suffix}"
+                spooled.write_bytes(source.getvalue())
+                source = spooled
+            parts.extend((f"{name} [{sheet}]", source, sheet, digest) for sheet in excel_sheet_names(source))
+        else:
+            parts.append((name, source if local else (name, source.getvalue()), None, None))
+    return parts
+
+
+def load_part(part, cache_dir=EXCEL_CACHE_DIR):
+    """Read, validate and prepare one sheet or file; returns (label, prepared frame or None, missing columns)"""
+    label, source, sheet, digest = part
+    if isinstance(source, tuple):
+        source = _named_bytes(*source)
+
+    if sheet is None:
+        ledger = load_ledger(source, cache_dir)
+    else:
+        ledger = read_excel_ledger(source, cache_dir, sheet_name=sheet, digest=digest)
+
+    if not validate_data_structure(ledger):
+        return label, None, [column for column in REQUIRED_COLUMNS if column not in ledger.columns]
+    return label, prepare_ledger(ledger), []
+
+
+def concat_prepared(frames):
+    """One prepared frame from many, with each categorical column's categories unified first.
+
+    Categories are unioned (not re-inferred from the rows), so the concat
+    recodes integer codes instead of falling back to object columns.
+    """
+    if len(frames) == 1:
+        return frames[0]
+
+    aligned = [frame.copy(deep=False) for frame in frames]
+    for column in frames[0].columns:
+        if not isinstance(frames[0][column].dtype, pd.CategoricalDtype):
+            continue
+        categories = frames[0][column].cat.categories
+        for frame in frames[1:]:
+            categories = categories.union(frame[column].cat.categories, sort=False)
+        dtype = pd.CategoricalDtype(categories)
+        for frame in aligned:
+            frame[column] = frame[column].astype(dtype)
+    return pd.concat(aligned, ignore_index=True)
+
+
+def load_ledgers(sources, workers=MAX_INGEST_WORKERS, cache_dir=EXCEL_CACHE_DIR):
+    """Prepared ledger of every valid sheet and file, plus {label: missing columns} for skipped ones.
+
+    Rows dropped for an unreadable Posting Date and the uncompacted memory are
+    summed across all parts in the ledger's attrs (see preparation.invalid_dates
+    and schema.memory_baseline). Raises ValueError when
+    no sheet or file has the required columns.
+    """
+    with tempfile.TemporaryDirectory(prefix='sales-ingest-') as spool_dir:
+        parts = ledger_parts(sources, spool_dir)
+        workers = min(workers, len(parts))
+        if workers <= 1:
+            results = [load_part(part, cache_dir) for part in parts]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(load_part, parts, [cache_dir] * len(parts)))
+
+    frames = [frame for _, frame, _ in results if frame is not None]
+    skipped = {label: missing for label, frame, missing in results if frame is None}
+    if not frames:
+        raise ValueError(f"Missing required columns. Required: {', '.join(REQUIRED_COLUMNS)}")
+    prepared = concat_prepared(frames)
+    prepared.attrs['invalid_dates'] = sum(invalid_dates(frame) for frame in frames)
+    prepared.attrs['uncompacted_mb'] = summed_baseline(frames)
+    return prepared, skipped
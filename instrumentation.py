@@ -0,0 +1,110 @@
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+import pandas as pd
+
+# The probe collecting the current run. A ContextVar keeps concurrent Streamlit
+# sessions (one script thread each) from writing into each other's records.
+_active_probe = ContextVar('active_probe', default=None)
+
+# tracemalloc has one process-wide peak, which every traced run resets and
+# reads, so only one session traces memory at a time
+_trace_lock = threading.Lock()
+
+
+class Instrumentation:
+    """Opt-in per-stage wall time, row counts and peak memory for one run.
+
+    Use it as a context manager around the run; code inside records stages with
+    the module-level stage() helper, which is a no-op when no probe is active.
+    Peak memory comes from tracemalloc, which is process-wide and slows
+    allocation-heavy code, so it is only traced when trace_memory is set.
+    Traced runs are serialized: a second session asking for memory tracing
+    waits until the first one's run has finished. Allocations by untraced
+    sessions running at the same time still count towards the peak.
+    """
+
+    def __init__(self, trace_memory=False, log_path=None, context=None):
+        self.trace_memory = trace_memory
+        self.log_path = Path(log_path) if log_path else None
+        self.context = context or {}
+        self.records = []
+        self._open = []
+        self._token = None
+        self._started_tracing = False
+
+    def __enter__(self):
+        if self.trace_memory:
+            _trace_lock.acquire()
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+        self._token = _active_probe.set(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        _active_probe.reset(self._token)
+        if self.trace_memory:
+            if self._started_tracing:
+                tracemalloc.stop()
+                self._started_tracing = False
+            _trace_lock.release()
+        if self.log_path and self.records:
+            self.write_jsonl(self.log_path)
+        return False
+
+    def _fold_peak(self):
+        # Stages share one tracemalloc peak, so before it is reset the peak so
+        # far is credited to every stage that is still open
+        peak = tracemalloc.get_traced_memory()[1]
+        for record in self._open:
+            record['_peak'] = max(record['_peak'], peak)
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        record = {'stage': name, 'depth': len(self._open), 'rows_in': rows_in, 'rows_out': None,
+                  'seconds': None, 'peak_mb': None}
+        if self.trace_memory:
+            self._fold_peak()
+            tracemalloc.reset_peak()
+            record['_base'] = tracemalloc.get_traced_memory()[0]
+            record['_peak'] = record['_base']
+        self._open.append(record)
+        self.records.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            if self.trace_memory:
+                self._fold_peak()
+                record['peak_mb'] = (record.pop('_peak') - record.pop('_base')) / 1024 ** 2
+            self._open.pop()
+
+    def to_frame(self):
+        columns = ['stage', 'depth', 'rows_in', 'rows_out', 'seconds', 'peak_mb']
+        return pd.DataFrame(self.records, columns=columns)
+
+    def write_jsonl(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        timestamp = time.time()
+        with path.open('a') as log:
+            for record in self.records:
+                log.write(json.dumps({'timestamp': timestamp, **self.context, **record}, default=str) + "\n")
+
+
+@contextmanager
+def stage(name, rows_in=None):
+    """Record a stage on the active probe; yields a dict whose rows_out the caller may fill"""
+    probe = _active_probe.get()
+    if probe is None:
+        yield {}
+        return
+    with probe.stage(name, rows_in) as record:
+        yield record
@@ -0,0 +1,39 @@
+from data_loader import parse_dates
+from fiscal_calendar import attach_calendar
+from schema import apply_schema
+
+
+def invalid_dates(df):
+    """Rows parse_posting_dates (or prepare_ledger) dropped for an unreadable Posting Date"""
+    return df.attrs.get('invalid_dates', 0)
+
+
+def parse_posting_dates(df, date_format=None):
+    """Add the parsed Date column and drop rows whose Posting Date is invalid.
+
+    The number of dropped rows is kept in the result's attrs, see invalid_dates().
+    """
+    # assign returns a new frame, the caller's ledger is never copied or mutated
+    df = df.assign(Date=parse_dates(df['Posting Date'], date_format))
+    parsed = df.dropna(subset=['Date'])
+    parsed.attrs['invalid_dates'] = len(df) - len(parsed)
+    return parsed
+
+
+def add_derived_columns(df):
+    """Sales measures and calendar fields for a ledger with a parsed Date column"""
+    df = df.assign(Abs_Sales=df['Sales Amount'].abs())
+
+    # Calendar fields (fiscal year/week, labels, month, season) joined from the cached
+    # per-date calendar table, so string formatting scales with distinct dates, not rows
+    df = attach_calendar(df)
+
+    # Categorical text and narrow calendar integers keep the prepared frame small
+    return apply_schema(df)
+
+
+def prepare_ledger(df, date_format=None):
+    parsed = parse_posting_dates(df, date_format)
+    prepared = add_derived_columns(parsed)
+    prepared.attrs['invalid_dates'] = invalid_dates(parsed)
+    return prepared
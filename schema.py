@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+
+# Compact dtypes for the prepared ledger. Repeated text becomes categorical so
+# filters compare integer codes and calendar integers drop to 32 bits or less.
+# The summed measures stay float64, float32 totals drift visibly at ledger scale.
+PREPARED_SCHEMA = {
+    'Item No': 'category',
+    'Description': 'category',
+    'Source No': 'category',
+    'Name': 'category',
+    'Month': 'category',
+    'Fiscal_Week_Str': 'category',
+    'Week_Label': 'category',
+    'Season': 'category',
+    'Invoiced Quantity': 'float64',
+    'Sales Amount': 'float64',
+    'Abs_Sales': 'float64',
+    'Date_Key': 'int32',
+    'Fiscal_Year': 'int16',
+    'Year': 'int16',
+    'Week_Number': 'int8',
+    'Month_Num': 'int8',
+    'Weekday': 'int8',
+}
+
+# Raw text columns that are redundant once the Date column has been parsed
+PARSED_COLUMNS = ['Posting Date']
+
+
+def _column_mb(df):
+    return df.memory_usage(deep=True, index=False) / 1024 ** 2
+
+
+def apply_schema(df, schema=PREPARED_SCHEMA):
+    """Cast a prepared ledger to the compact schema and drop text columns that were already parsed.
+
+    Only the per-column MB of the uncompacted frame is kept, in the result's
+    attrs (see memory_baseline), never the frame itself.
+    """
+    baseline = _column_mb(df).to_dict()
+    df = df.drop(columns=[column for column in PARSED_COLUMNS if column in df.columns])
+    for column, dtype in schema.items():
+        if column in df.columns and df[column].dtype != dtype:
+            df[column] = df[column].astype(dtype)
+    df.attrs['uncompacted_mb'] = baseline
+    return df
+
+
+def memory_baseline(df):
+    """Per-column MB a frame took before apply_schema compacted it, or None when unknown"""
+    return df.attrs.get('uncompacted_mb')
+
+
+def summed_baseline(frames):
+    """memory_baseline of frames concatenated into one, or None when any of them has none"""
+    baselines = [memory_baseline(frame) for frame in frames]
+    if not baselines or any(baseline is None for baseline in baselines):
+        return None
+    return pd.DataFrame(baselines).sum().to_dict()
+
+
+# Blank customer names, item numbers and descriptions are grouped under this label
+# instead of being dropped by groupby, so every view keeps every ledger row
+UNKNOWN_LABEL = '(unknown)'
+
+
+def with_unknown(column):
+    """column with missing values replaced by UNKNOWN_LABEL, adding the category if needed"""
+    if not column.hasnans:
+        return column
+    if isinstance(column.dtype, pd.CategoricalDtype) and UNKNOWN_LABEL not in column.cat.categories:
+        column = column.cat.add_categories([UNKNOWN_LABEL])
+    return column.fillna(UNKNOWN_LABEL)
+
+
+def equals_mask(column, value):
+    """Boolean mask for column == value, comparing category codes when the column is categorical"""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        code = column.cat.categories.get_indexer([value])[0]
+        if code < 0:
+            return np.zeros(len(column), dtype=bool)
+        return column.cat.codes.to_numpy() == code
+    return (column == value).to_numpy()
+
+
+def memory_report(df, baseline=None):
+    """Per-column memory usage in MB, next to the uncompacted MB when known.
+
+    baseline is a {column: MB} mapping and defaults to memory_baseline(df);
+    columns apply_schema dropped are listed with the dtype 'dropped'.
+    """
+    report = pd.DataFrame({'Dtype': df.dtypes.astype(str), 'MB': _column_mb(df)})
+    if baseline is None:
+        baseline = memory_baseline(df)
+    if baseline:
+        report = report.join(pd.Series(baseline, name='Uncompacted MB', dtype=float), how='outer')
+        report['Dtype'] = report['Dtype'].fillna('dropped')
+    report.loc['Total'] = report.sum(numeric_only=True)
+    report.loc['Total', 'Dtype'] = ''
+    return report.round(3)
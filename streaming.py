@@ -0,0 +1,48 @@
+import pandas as pd
+
+from cube import CUBE_KEYS, build_cube, rollup
+from data_loader import DEFAULT_CHUNK_ROWS, REQUIRED_COLUMNS, guess_date_format, iter_ledger_chunks
+from preparation import invalid_dates, prepare_ledger
+from schema import apply_schema
+
+# Partial cubes are merged whenever this many have piled up, which bounds
+# memory by a handful of cubes plus one raw chunk
+FOLD_EVERY = 8
+
+
+def _fold(partials):
+    # Chunks carry their own categories, so the concat falls back to object
+    # columns and the schema re-categorizes the merged cube
+    combined = pd.concat(partials, ignore_index=True)
+    keys = [key for key in CUBE_KEYS if key in combined.columns]
+    return apply_schema(rollup(combined, keys))
+
+
+def stream_cube(source, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Aggregate cube of a CSV/Parquet/Arrow ledger, prepared and folded chunk by chunk.
+
+    The full row-level frame never exists, so peak memory is one chunk plus the
+    running aggregates regardless of ledger size. The date format is guessed
+    from the first chunk and used for every chunk, so the streamed cube reads
+    dates exactly like a loaded ledger; rows with an unreadable Posting Date are
+    counted in the cube's attrs (see preparation.invalid_dates).
+    """
+    partials, date_format, invalid = [], None, 0
+    for index, chunk in enumerate(iter_ledger_chunks(source, chunk_rows)):
+        missing = [column for column in REQUIRED_COLUMNS if column not in chunk.columns]
+        if missing:
+            raise ValueError(f"Missing required columns: {', '.join(missing)}")
+
+        if index == 0:
+            date_format = guess_date_format(chunk['Posting Date'])
+        prepared = prepare_ledger(chunk, date_format)
+        invalid += invalid_dates(prepared)
+        partials.append(build_cube(prepared))
+        if len(partials) >= FOLD_EVERY:
+            partials = [_fold(partials)]
+
+    if not partials:
+        return build_cube(prepare_ledger(pd.DataFrame(columns=REQUIRED_COLUMNS)))
+    cube = _fold(partials)
+    cube.attrs['invalid_dates'] = invalid
+    return cube
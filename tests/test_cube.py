@@ -0,0 +1,38 @@
+import pandas as pd
+
+from cube import build_cube
+from drilldown import Drilldown
+from export import export_summaries
+from filter_index import FilterIndex
+from preparation import prepare_ledger
+from schema import UNKNOWN_LABEL
+from trend_tables import monthly_trend_table, weekly_trend_table, yearly_trend_table
+
+
+def ledger():
+    return pd.DataFrame({
+        'Posting Date': pd.to_datetime(['2023-01-06', '2023-01-07', '2023-01-09']),
+        'Item No': ['BCH-1', 'BCH-2', None],
+        'Description': ['Gouda', None, 'Butter'],
+        'Source No': ['1', '2', '3'],
+        'Name': ['Cafe', None, 'Hotel'],
+        'Invoiced Quantity': [-1.0, -2.0, -3.0],
+        'Sales Amount': [10.0, 20.0, 30.0],
+    })
+
+
+def test_blank_customer_rows_stay_in_every_view(tmp_path):
+    prepared = prepare_ledger(ledger())
+    cube = build_cube(prepared)
+    index = FilterIndex(cube)
+
+    assert UNKNOWN_LABEL in set(cube['Name'])
+    assert weekly_trend_table(index, "All")['Abs_Sales'].sum() == 60
+    assert monthly_trend_table(index, "All")['Abs_Sales'].sum() == 60
+    assert yearly_trend_table(index, "All")['Abs_Sales'].sum() == 60
+    assert weekly_trend_table(index, UNKNOWN_LABEL)['Abs_Sales'].sum() == 20
+    assert Drilldown.from_prepared(prepared).weekly()['Abs_Sales'].sum() == 60
+
+    written = export_summaries(cube, tmp_path / 'summaries.csv.zip', 'csv')
+    # All three postings fall in one fiscal week, one row per customer
+    assert written['weekly'] == 3
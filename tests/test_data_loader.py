@@ -0,0 +1,15 @@
+import os
+
+from data_loader import evict_excel_cache
+
+
+def test_excel_cache_evicts_least_recently_read_sheets(tmp_path):
+    for age, name in enumerate(['newest', 'recent', 'old', 'oldest']):
+        path = tmp_path / f"{name}.parquet"
+        path.write_bytes(b'x' * 100)
+        os.utime(path, (1_000_000 - age, 1_000_000 - age))
+
+    # The sheet just written is kept even though it is the oldest
+    evict_excel_cache(tmp_path, max_bytes=250, keep=[tmp_path / 'oldest.parquet'])
+
+    assert sorted(path.stem for path in tmp_path.iterdir()) == ['newest', 'oldest']
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from downsampling import downsample, lttb_indices
+
+
+def reference_lttb(x, y, threshold):
+    """Textbook Largest-Triangle-Three-Buckets, one point at a time"""
+    n = len(y)
+    every = (n - 2) / (threshold - 2)
+    keep, anchor = [0], 0
+    for bucket in range(threshold - 2):
+        start = int(np.floor(bucket * every)) + 1
+        end = int(np.floor((bucket + 1) * every)) + 1
+        next_end = min(int(np.floor((bucket + 2) * every)) + 1, n)
+        next_x, next_y = np.mean(x[end:next_end]), np.mean(y[end:next_end])
+        areas = [abs((x[anchor] - next_x) * (y[i] - y[anchor]) - (x[anchor] - x[i]) * (next_y - y[anchor]))
+                 for i in range(start, end)]
+        anchor = start + int(np.argmax(areas))
+        keep.append(anchor)
+    keep.append(n - 1)
+    return np.array(keep)
+
+
+@pytest.fixture
+def series():
+    rng = np.random.default_rng(3)
+    x = np.arange(5_000, dtype=np.float64)
+    y = np.cumsum(rng.normal(size=len(x)))
+    # Isolated spikes that a bucket's largest triangle can miss
+    y[1234], y[3210] = y.max() + 50, y.min() - 50
+    return x, y
+
+
+@pytest.mark.parametrize('threshold', [3, 10, 100, 999])
+def test_keeps_endpoints_and_extremes(series, threshold):
+    x, y = series
+    keep = lttb_indices(x, y, threshold)
+    assert keep[0] == 0 and keep[-1] == len(y) - 1
+    assert np.argmax(y) in keep and np.argmin(y) in keep
+    assert np.all(np.diff(keep) > 0)
+    assert len(keep) <= threshold + 2
+
+
+@pytest.mark.parametrize('threshold', [3, 10, 100, 999])
+def test_matches_reference_lttb(series, threshold):
+    x, y = series
+    np.testing.assert_array_equal(lttb_indices(x, y, threshold, keep_extremes=False),
+                                  reference_lttb(x, y, threshold))
+
+
+def test_short_series_is_unchanged(series):
+    x, y = series
+    np.testing.assert_array_equal(lttb_indices(x[:50], y[:50], 100), np.arange(50))
+
+
+def test_downsample_frame_with_dates(series):
+    _, y = series
+    frame = pd.DataFrame({'Fiscal_Week_Start': pd.date_range('2020-07-03', periods=len(y), freq='7D'),
+                          'Abs_Sales': y})
+    reduced = downsample(frame, 'Fiscal_Week_Start', 'Abs_Sales', 200)
+    assert len(reduced) <= 202
+    assert reduced['Fiscal_Week_Start'].is_monotonic_increasing
+    assert reduced.index[0] == 0 and reduced.index[-1] == len(frame) - 1
+    assert reduced['Abs_Sales'].max() == y.max() and reduced['Abs_Sales'].min() == y.min()
@@ -0,0 +1,34 @@
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from filter_index import FilterIndex
+
+
+class SlowCache(OrderedDict):
+    # Yields between the membership test and move_to_end, where another
+    # thread can evict the entry when the LRU is not guarded
+    def __contains__(self, key):
+        found = super().__contains__(key)
+        time.sleep(0.0001)
+        return found
+
+
+def test_shared_index_survives_concurrent_selects():
+    frame = pd.DataFrame({'Name': [f"Customer {i % 6}" for i in range(600)],
+                          'Fiscal_Year': [2023 + i % 3 for i in range(600)],
+                          'Abs_Sales': 1.0})
+    index = FilterIndex(frame, cache_size=2)
+    index._cache = SlowCache()
+
+    def select(number):
+        return len(index.select(Name=f"Customer {number % 6}", Fiscal_Year=2023 + number % 3))
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        sizes = list(pool.map(select, range(2_000)))
+
+    expected = frame.groupby(['Name', 'Fiscal_Year']).size()
+    assert sizes == [expected.get((f"Customer {n % 6}", 2023 + n % 3), 0) for n in range(2_000)]
+    assert len(index._cache) <= 2
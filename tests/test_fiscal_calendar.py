@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from fiscal_calendar import attach_calendar, fiscal_calendar
+
+
+def loop_calendar(dates):
+    """The original per-row fiscal calendar from prepare_data, kept as the reference"""
+    rows = []
+    for date in dates:
+        fiscal_year = date.year if date.month >= 7 else date.year - 1
+        fiscal_start = datetime(fiscal_year, 7, 1)
+        days_to_friday = (4 - fiscal_start.weekday()) % 7
+        first_friday = fiscal_start + timedelta(days=days_to_friday)
+        if fiscal_start.weekday() > 4:
+            first_friday = fiscal_start - timedelta(days=(fiscal_start.weekday() - 4))
+
+        week_start = date - timedelta(days=(date.weekday() + 3) % 7)
+        if week_start >= first_friday:
+            week_number = ((week_start - first_friday).days // 7) + 1
+        else:
+            week_number = 1
+        rows.append({
+            'Fiscal_Year': fiscal_year,
+            'Weekday': date.weekday(),
+            'Fiscal_Week_Start': week_start,
+            'Week_Number': min(week_number, 53),
+            'Month': date.strftime('%B'),
+            'Month_Num': date.month,
+            'Year': date.year,
+        })
+    return pd.DataFrame(rows)
+
+
+def every_day(first='2015-01-01', last='2030-12-31'):
+    # Sixteen years cover 1 July falling on every weekday, with and without a leap day
+    return pd.Series(pd.date_range(first, last, freq='D'))
+
+
+def test_vectorized_calendar_matches_loop():
+    dates = every_day()
+    expected = loop_calendar(dates)
+    actual = fiscal_calendar(dates)[expected.columns]
+    pd.testing.assert_frame_equal(actual.reset_index(drop=True), expected, check_dtype=False)
+
+
+def test_calendar_keeps_time_of_day_in_week_start():
+    rng = np.random.default_rng(0)
+    dates = every_day() + pd.to_timedelta(rng.integers(0, 86_400, len(every_day())), unit='s')
+    expected = loop_calendar(dates)
+    actual = fiscal_calendar(dates)[expected.columns]
+    pd.testing.assert_frame_equal(actual.reset_index(drop=True), expected, check_dtype=False)
+
+
+def test_attached_calendar_matches_loop():
+    rng = np.random.default_rng(1)
+    dates = every_day().sample(5_000, random_state=2).reset_index(drop=True)
+    ledger = pd.DataFrame({'Date': dates, 'Sales Amount': rng.normal(size=len(dates))})
+    expected = loop_calendar(dates)
+
+    attached = attach_calendar(ledger)
+    columns = ['Fiscal_Year', 'Week_Number', 'Month', 'Month_Num', 'Year']
+    pd.testing.assert_frame_equal(attached[columns].astype({'Month': object}), expected[columns], check_dtype=False)
+    assert (attached['Fiscal_Week_Start'] == expected['Fiscal_Week_Start'].dt.normalize()).all()
+    assert (attached['Fiscal_Week_Str'] == expected['Fiscal_Week_Start'].dt.strftime('%Y-%m-%d')).all()
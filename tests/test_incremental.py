@@ -0,0 +1,93 @@
+import pandas as pd
+import pytest
+
+from anomalies import detect_anomalies, update_anomalies
+from benchmarks.synthetic_ledger import generate_ledger
+from cube import CUBE_MEASURES, build_cube
+from drilldown import Drilldown
+from incremental import append_rows, merge_rows, prepare_rows
+from preparation import prepare_ledger
+
+CELL_KEYS = ['Name', 'Fiscal_Year', 'Year', 'Month_Num', 'Fiscal_Week_Start']
+
+
+@pytest.fixture(scope='module')
+def ledger():
+    return generate_ledger(40_000, seed=7, customers=30, items=150)
+
+
+@pytest.fixture(scope='module')
+def split(ledger):
+    """Base history plus two daily drops, each overlapping the one before by a couple of days"""
+    dates = pd.to_datetime(ledger['Posting Date'], dayfirst=True)
+    first_cut = dates.max() - pd.Timedelta(days=20)
+    second_cut = dates.max() - pd.Timedelta(days=8)
+    base = ledger[dates <= first_cut]
+    first = ledger[(dates > first_cut - pd.Timedelta(days=2)) & (dates <= second_cut)]
+    second = ledger[dates > second_cut - pd.Timedelta(days=1)]
+    return base, first, second
+
+
+def canonical(frame, keys, measures=CUBE_MEASURES):
+    """Rows sorted by plain-valued keys, so frames built in different orders compare equal"""
+    frame = frame.assign(**{key: frame[key].astype(str) for key in keys})
+    return frame.sort_values(keys).reset_index(drop=True)[keys + list(measures)]
+
+
+def assert_cells_equal(actual, expected, keys, measures=CUBE_MEASURES):
+    pd.testing.assert_frame_equal(canonical(actual, keys, measures), canonical(expected, keys, measures),
+                                  check_dtype=False)
+
+
+def test_appends_match_full_rebuild(ledger, split):
+    base, first, second = split
+    prepared = prepare_ledger(base)
+    merged, cube, first_report = append_rows(prepared, build_cube(prepared), first)
+    merged, cube, second_report = append_rows(merged, cube, second)
+
+    full = prepare_ledger(ledger)
+    assert len(merged) == len(full)
+    assert first_report['duplicates_dropped'] > 0 and second_report['duplicates_dropped'] > 0
+    assert_cells_equal(cube, build_cube(full), CELL_KEYS)
+
+
+def test_batched_deltas_match_full_rebuild(ledger, split):
+    base, first, second = split
+    prepared = prepare_ledger(base)
+    first_rows, _ = prepare_rows(prepared, first)
+    second_rows, _ = prepare_rows(prepared, second, first_rows)
+    merged, cube, new_rows = merge_rows(prepared, build_cube(prepared), [first_rows, second_rows])
+
+    assert len(merged) == len(prepared) + len(new_rows) == len(ledger)
+    assert_cells_equal(cube, build_cube(prepare_ledger(ledger)), CELL_KEYS)
+
+
+def test_overlap_can_be_rejected(split):
+    base, first, _ = split
+    prepared = prepare_ledger(base)
+    with pytest.raises(ValueError, match='overlap'):
+        append_rows(prepared, build_cube(prepared), first, on_overlap='raise')
+
+
+def test_appended_drilldown_matches_full_rebuild(ledger, split):
+    base, first, _ = split
+    prepared = prepare_ledger(base)
+    new_rows, _ = prepare_rows(prepared, first)
+
+    appended = Drilldown.from_prepared(prepared).appended(new_rows)
+    merged = pd.concat([prepared, new_rows], ignore_index=True)
+    keys = ['Name', 'Family', 'Item No', 'Description', 'Fiscal_Week_Start']
+    assert_cells_equal(appended.items.frame, Drilldown.from_prepared(merged).items.frame, keys)
+
+
+def test_updated_anomalies_match_full_rescoring(split):
+    base, first, _ = split
+    prepared = prepare_ledger(base)
+    merged, _, _ = append_rows(prepared, build_cube(prepared), first)
+    new_rows = merged.iloc[len(prepared):]
+
+    keys = ['Name', 'Item No', 'Fiscal_Week_Start', 'Measure']
+    updated = update_anomalies(detect_anomalies(prepared), merged, new_rows)
+    expected = detect_anomalies(merged)
+    assert len(expected) > 0
+    assert_cells_equal(updated, expected, keys, ['Amount', 'Median', 'Z_Score'])
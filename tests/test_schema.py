@@ -0,0 +1,27 @@
+import pytest
+
+from benchmarks.synthetic_ledger import generate_ledger
+from cube import build_cube
+from incremental import merge_rows, prepare_rows
+from preparation import prepare_ledger
+from schema import memory_baseline, memory_report
+
+
+def test_memory_report_shows_uncompacted_sizes():
+    ledger = generate_ledger(2_000, seed=3)
+    prepared = prepare_ledger(ledger)
+    report = memory_report(prepared)
+
+    assert report.loc['Posting Date', 'Dtype'] == 'dropped'
+    assert report.loc['Name', 'Uncompacted MB'] > report.loc['Name', 'MB']
+    assert report.loc['Total', 'Uncompacted MB'] > report.loc['Total', 'MB']
+
+
+def test_appended_ledger_sums_the_baselines():
+    ledger = generate_ledger(2_000, seed=3)
+    base = prepare_ledger(ledger.iloc[:1_500])
+    delta, _ = prepare_rows(base, ledger.iloc[1_500:])
+    merged, _, _ = merge_rows(base, build_cube(base), [delta])
+
+    assert memory_baseline(merged)['Name'] == pytest.approx(
+        memory_baseline(base)['Name'] + memory_baseline(delta)['Name'])
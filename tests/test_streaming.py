@@ -0,0 +1,53 @@
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic_ledger import generate_ledger
+from cube import CUBE_MEASURES, build_cube
+from data_loader import load_ledger
+from preparation import invalid_dates, prepare_ledger
+from streaming import stream_cube
+
+KEYS = ['Name', 'Fiscal_Year', 'Year', 'Month_Num', 'Fiscal_Week_Start']
+
+
+def canonical(cube):
+    cube = cube.assign(**{key: cube[key].astype(str) for key in KEYS})
+    return cube.sort_values(KEYS).reset_index(drop=True)[KEYS + CUBE_MEASURES]
+
+
+@pytest.fixture
+def ledger():
+    ledger = generate_ledger(20_000, seed=1)
+    dates = pd.to_datetime(ledger['Posting Date'], dayfirst=True)
+    # Text dates with a May row first, where a single-value guess reads a full month name
+    ledger['Posting Date'] = dates.dt.strftime('%d %b %Y')
+    first_may = int((dates.dt.month == 5).to_numpy().argmax())
+    order = [first_may] + [row for row in range(len(ledger)) if row != first_may]
+    return ledger.iloc[order].reset_index(drop=True)
+
+
+@pytest.mark.parametrize('suffix', ['.csv', '.parquet'])
+def test_streamed_cube_matches_loaded_cube(tmp_path, ledger, suffix):
+    path = tmp_path / f"ledger{suffix}"
+    if suffix == '.csv':
+        ledger.to_csv(path, index=False)
+    else:
+        ledger.to_parquet(path, index=False)
+
+    prepared = prepare_ledger(load_ledger(path))
+    assert len(prepared) == len(ledger)
+    streamed = stream_cube(path, chunk_rows=700)
+    pd.testing.assert_frame_equal(canonical(streamed), canonical(build_cube(prepared)), check_dtype=False)
+    assert invalid_dates(streamed) == 0
+
+
+def test_unreadable_dates_are_counted(tmp_path, ledger):
+    ledger.loc[[3, 5_000, 12_345], 'Posting Date'] = 'not a date'
+    path = tmp_path / 'ledger.csv'
+    ledger.to_csv(path, index=False)
+
+    prepared = prepare_ledger(load_ledger(path))
+    assert invalid_dates(prepared) == 3 and len(prepared) == len(ledger) - 3
+    streamed = stream_cube(path, chunk_rows=700)
+    assert invalid_dates(streamed) == 3
+    pd.testing.assert_frame_equal(canonical(streamed), canonical(build_cube(prepared)), check_dtype=False)
@@ -2,13 +2,48 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from datetime import datetime, timedelta
 import numpy as np
-from functools import lru_cache
+import shutil
+import uuid
+from pathlib import Path
+
+from analytics import ROLLING_WINDOWS, period_metrics
+from anomalies import Z_THRESHOLD, detect_anomalies, update_anomalies, weekly_flags
+from cube import build_cube
+from data_loader import REQUIRED_COLUMNS, EXCEL_SUFFIXES, LEDGER_FILE_TYPES, load_ledger, list_ledger_files
+from downsampling import downsample
+from export import EXPORT_FORMATS, EXPORT_SUFFIXES, export_charts, export_summaries
+from drilldown import Drilldown
+from dataset_cache import dataset_key, evict, load_dataset, source_key, store_dataset
+from dataset_registry import DatasetRegistry
+from filter_index import FilterIndex
+from forecasting import FORECAST_VERSION, FORECAST_WEEKS, WeeklyForecaster
+from incremental import merge_rows, prepare_rows, touched_cells
+from ingest import load_ledgers
+from instrumentation import Instrumentation, stage
+from preparation import parse_posting_dates, add_derived_columns, invalid_dates, prepare_ledger
+from schema import memory_report
+from streaming import stream_cube
+from trend_tables import (SEASON_COLORS, summary_table, validate_data_structure,
+                          weekly_trend_table, monthly_trend_table, yearly_trend_table)
 
 # Configure page
 st.set_page_config(page_title="Sales Trend Analysis", layout="wide")
 
+# JSON lines file for the diagnostics panel's optional log. It is fixed on the
+# server, since a path typed into the browser could make the app write anywhere
+DIAGNOSTICS_LOG = Path('.ledger_cache') / 'diagnostics.jsonl'
+# Export files are written here and served from disk, never assembled in memory.
+# Each session keeps only its latest export, and the oldest sessions' exports are
+# evicted once the directory grows past EXPORT_MAX_BYTES.
+EXPORT_DIR = Path('.ledger_cache') / 'exports'
+EXPORT_MAX_BYTES = 1024 ** 3
+
+# Series longer than this are drawn with WebGL (Scattergl) instead of SVG
+WEBGL_POINT_THRESHOLD = 1000
+# WebGL series are downsampled with LTTB to about this many points
+MAX_CHART_POINTS = 1500
+
 st.title("📈 Sales Trend Analysis Dashboard")
 st.markdown("*Fiscal Year: July to June | Week: Friday to Thursday*")
 
@@ -28,108 +63,61 @@ def load_sample_data():
 # Optimized data preparation with memoization
 @st.cache_data(ttl=3600, show_spinner=False)
 def prepare_data(df):
-    df = df.copy()
-    
     # Convert date with error handling
     try:
-        df['Date'] = pd.to_datetime(df['Posting Date'], dayfirst=True, errors='coerce')
-        df = df.dropna(subset=['Date'])  # Remove rows with invalid dates
+        df = parse_posting_dates(df)  # Remove rows with invalid dates
     except Exception as e:
         st.error(f"Date conversion error: {str(e)}")
         return pd.DataFrame()
 
-    # Basic calculations
-    df['Abs_Sales'] = abs(df['Sales Amount'])
-    
-    # Vectorized fiscal year calculation (faster than apply)
-    df['Fiscal_Year'] = df['Date'].dt.year.where(df['Date'].dt.month >= 7, df['Date'].dt.year - 1)
-    
-    # Pre-calculate weekday for performance
-    df['Weekday'] = df['Date'].dt.weekday
-    
-    # Vectorized fiscal week start calculation
-    days_since_friday = (df['Weekday'] + 3) % 7
-    df['Fiscal_Week_Start'] = df['Date'] - pd.to_timedelta(days_since_friday, unit='d')
-    df['Fiscal_Week_Str'] = df['Fiscal_Week_Start'].dt.strftime('%Y-%m-%d')
-    
-    # Optimized week number calculation
-    def calculate_week_numbers(dates, fiscal_years):
-        week_numbers = []
-        for date, fiscal_year in zip(dates, fiscal_years):
-            fiscal_start = datetime(fiscal_year, 7, 1)
-            days_to_friday = (4 - fiscal_start.weekday()) % 7
-            first_friday = fiscal_start + timedelta(days=days_to_friday)
-            
-            if fiscal_start.weekday() > 4:
-                first_friday = fiscal_start - timedelta(days=(fiscal_start.weekday() - 4))
-            
-            week_start = date - timedelta(days=(date.weekday() + 3) % 7)
-            
-            if week_start >= first_friday:
-                week_number = ((week_start - first_friday).days // 7) + 1
-            else:
-                week_number = 1
-                
-            week_numbers.append(min(week_number, 53))
-        
-        return week_numbers
-    
-    df['Week_Number'] = calculate_week_numbers(df['Date'], df['Fiscal_Year'])
-    
-    # Add other date components
-    df['Month'] = df['Date'].dt.strftime('%B')
-    df['Month_Num'] = df['Date'].dt.month
-    df['Year'] = df['Date'].dt.year
-    
-    return df
+    return add_derived_columns(df)
 
-def classify_season(month_num):
-    # Simple lookup is faster than multiple ifs
-    season_map = {
-        11: "High Season", 12: "High Season", 1: "High Season",
-        6: "Low Season", 7: "Low Season", 8: "Low Season"
-    }
-    return season_map.get(month_num, "Moderate Season")
-
-# Optimized filtering function
-def get_filtered_data(df, customer_filter=None, year_filter=None, month_filter=None, fiscal_year_filter=None):
-    """Apply all filters to the dataframe efficiently using vectorized operations"""
-    mask = pd.Series(True, index=df.index)
-    
-    if customer_filter and customer_filter != "All":
-        mask &= (df['Name'] == customer_filter)
-    
-    if year_filter and year_filter != "All":
-        mask &= (df['Year'] == int(year_filter))
-    
-    if month_filter and month_filter != "All":
-        mask &= (df['Month'] == month_filter)
-        
-    if fiscal_year_filter and fiscal_year_filter != "All":
-        mask &= (df['Fiscal_Year'] == int(fiscal_year_filter))
-    
-    return df[mask].copy()  # Return a copy to avoid SettingWithCopyWarning
+@st.cache_data(ttl=3600, show_spinner=False)
+def load_cube(df):
+    return build_cube(df)
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def load_filter_index(dataset_id, _cube):
+    # cache_resource hands every rerun (and session) the same object, so its LRU survives reruns
+    return FilterIndex(_cube)
 
-# Optimized chart creation functions
-def create_weekly_trend(df, customer_filter=None, year_filter=None, month_filter=None, fiscal_year_filter=None):
-    filtered_df = get_filtered_data(df, customer_filter, year_filter, month_filter, fiscal_year_filter)
+# Chart creation functions plot the trend tables rolled up from the aggregate cube
+def add_forecast_band(fig, forecast, x):
+    """Overlay a forecast line and its confidence band on a weekly chart"""
+    fig.data[0].name = 'Actual'
+    fig.add_scatter(x=forecast[x], y=forecast['Upper'], mode='lines', line=dict(width=0),
+                    showlegend=False, hoverinfo='skip')
+    fig.add_scatter(x=forecast[x], y=forecast['Lower'], mode='lines', line=dict(width=0),
+                    fill='tonexty', fillcolor='rgba(255, 107, 107, 0.2)', name='95% band', hoverinfo='skip')
+    fig.add_scatter(x=forecast[x], y=forecast['Forecast'], mode='lines+markers', name='Forecast',
+                    line=dict(width=3, dash='dash', color='#ff6b6b'), marker=dict(size=6))
+    fig.update_layout(showlegend=True)
+    return fig
+
+def add_anomaly_markers(fig, weekly_data, flags, x):
+    """Mark the weeks holding unusual item sales or returns on a weekly chart"""
+    points = weekly_data[list(dict.fromkeys([x, 'Fiscal_Week_Start', 'Abs_Sales']))].merge(flags, on='Fiscal_Week_Start')
+    fig.data[0].name = 'Actual'
+    markers = [('Sales_Flags', 'Unusual sales', dict(symbol='circle-open', size=16, color='#d62728', line=dict(width=3))),
+               ('Return_Flags', 'Unusual returns', dict(symbol='x', size=12, color='#ff7f0e'))]
+    for column, name, marker in markers:
+        flagged = points[points[column] > 0]
+        if not flagged.empty:
+            fig.add_scatter(x=flagged[x], y=flagged['Abs_Sales'], mode='markers', name=name, marker=marker,
+                            customdata=flagged[['Items']], hovertemplate='%{x}<br>%{customdata[0]}<extra></extra>')
+    fig.update_layout(showlegend=True)
+    return fig
+
+def create_weekly_trend(cube, customer_filter=None, year_filter=None, month_filter=None, fiscal_year_filter=None,
+                        webgl_threshold=WEBGL_POINT_THRESHOLD, max_points=MAX_CHART_POINTS, forecast=None,
+                        anomaly_flags=None):
+    weekly_data = weekly_trend_table(cube, customer_filter, year_filter, month_filter, fiscal_year_filter)
     
-    if filtered_df.empty:
+    if weekly_data.empty:
         fig = px.line(title="No data available for selected filters")
         fig.update_layout(height=400)
         return fig, pd.DataFrame()
 
-    # Optimized groupby with named aggregation
-    weekly_data = filtered_df.groupby(['Fiscal_Week_Str', 'Week_Number', 'Fiscal_Week_Start'], as_index=False).agg(
-        Abs_Sales=('Abs_Sales', 'sum'),
-        Quantity=('Invoiced Quantity', 'sum')
-    ).sort_values('Fiscal_Week_Start')
-    
-    weekly_data['Week_Label'] = weekly_data.apply(
-        lambda row: f"Week {row['Week_Number']}<br>{row['Fiscal_Week_Start'].strftime('%b %d')}", 
-        axis=1
-    )
-
     # Build title
     title_parts = ['Weekly Sales Trend (Friday to Thursday)']
     if customer_filter != "All":
@@ -145,103 +133,494 @@ def create_weekly_trend(df, customer_filter=None, year_filter=None, month_filter
     if len(title_parts) > 1:
         title += f"<br><sub>{' | '.join(title_parts[1:])}</sub>"
 
-    fig = px.line(weekly_data, x='Week_Label', y='Abs_Sales', 
-                 title=title,
-                 labels={'Abs_Sales': 'Sales Amount', 'Week_Label': 'Week'})
-    
-    fig.update_traces(line=dict(width=3), mode='lines+markers', marker=dict(size=8))
-    fig.update_layout(
-        height=400,
-        xaxis_title='Week Number',
-        xaxis={'tickangle': -45}
-    )
+    if len(weekly_data) > webgl_threshold:
+        fig = create_long_weekly_trend(weekly_data, title, max_points)
+        if forecast is not None:
+            add_forecast_band(fig, forecast, 'Fiscal_Week_Start')
+        if anomaly_flags is not None:
+            add_anomaly_markers(fig, weekly_data, anomaly_flags, 'Fiscal_Week_Start')
+        return fig, weekly_data
+
+    with stage('weekly_figure', len(weekly_data)):
+        fig = px.line(weekly_data, x='Week_Label', y='Abs_Sales', 
+                     title=title,
+                     labels={'Abs_Sales': 'Sales Amount', 'Week_Label': 'Week'})
+        
+        fig.update_traces(line=dict(width=3), mode='lines+markers', marker=dict(size=8))
+        fig.update_layout(
+            height=400,
+            xaxis_title='Week Number',
+            xaxis={'tickangle': -45}
+        )
+    if forecast is not None:
+        add_forecast_band(fig, forecast, 'Week_Label')
+    if anomaly_flags is not None:
+        add_anomaly_markers(fig, weekly_data, anomaly_flags, 'Week_Label')
 
     return fig, weekly_data
 
-def create_monthly_trend(df, customer_filter=None):
-    filtered_df = get_filtered_data(df, customer_filter)
+def create_long_weekly_trend(weekly_data, title, max_points=MAX_CHART_POINTS):
+    """WebGL weekly line on a date axis, downsampled with LTTB so the peaks survive"""
+    with stage('weekly_downsample', len(weekly_data)) as record:
+        points = downsample(weekly_data, 'Fiscal_Week_Start', 'Abs_Sales', max_points)
+        record['rows_out'] = len(points)
+    if len(points) < len(weekly_data):
+        title += f"<br><sub>Showing {len(points):,} of {len(weekly_data):,} weeks</sub>"
 
-    monthly_data = filtered_df.groupby(['Month', 'Month_Num'], as_index=False).agg(
-        Abs_Sales=('Abs_Sales', 'sum'),
-        Quantity=('Invoiced Quantity', 'sum')
-    ).sort_values('Month_Num')
-    
-    monthly_data['Season'] = monthly_data['Month_Num'].apply(classify_season)
+    with stage('weekly_figure', len(points)):
+        fig = px.line(points, x='Fiscal_Week_Start', y='Abs_Sales', title=title,
+                      labels={'Abs_Sales': 'Sales Amount', 'Fiscal_Week_Start': 'Week Starting'},
+                      hover_data={'Week_Label': True, 'Quantity': True},
+                      render_mode='webgl')
+        fig.update_traces(line=dict(width=2), mode='lines+markers', marker=dict(size=4))
+        fig.update_layout(height=400, xaxis_title='Week Starting')
+    return fig
 
-    color_map = {'High Season': '#ff6b6b', 'Moderate Season': '#4ecdc4', 'Low Season': '#45b7d1'}
+def create_monthly_trend(cube, customer_filter=None):
+    monthly_data = monthly_trend_table(cube, customer_filter)
 
-    fig = px.bar(monthly_data, x='Month', y='Abs_Sales', color='Season',
-                title='Monthly Sales Trend with Seasonal Classification',
-                labels={'Abs_Sales': 'Sales Amount'},
-                color_discrete_map=color_map)
-    fig.update_layout(height=400)
+    with stage('monthly_figure', len(monthly_data)):
+        fig = px.bar(monthly_data, x='Month', y='Abs_Sales', color='Season',
+                    title='Monthly Sales Trend with Seasonal Classification',
+                    labels={'Abs_Sales': 'Sales Amount'},
+                    color_discrete_map=SEASON_COLORS)
+        fig.update_layout(height=400)
 
     return fig, monthly_data
 
-def create_yearly_trend(df, customer_filter=None):
-    filtered_df = get_filtered_data(df, customer_filter)
-
+def create_yearly_trend(cube, customer_filter=None, webgl_threshold=WEBGL_POINT_THRESHOLD):
     try:
-        yearly_data = filtered_df.groupby(['Fiscal_Year', 'Month', 'Month_Num'], as_index=False).agg(
-            Abs_Sales=('Abs_Sales', 'sum'),
-            Quantity=('Invoiced Quantity', 'sum')
-        ).sort_values(['Fiscal_Year', 'Month_Num'])
+        yearly_data = yearly_trend_table(cube, customer_filter)
     except KeyError as e:
         st.error(f"Data error: {str(e)}")
         return px.line(), pd.DataFrame()
 
-    yearly_data['Season'] = yearly_data['Month_Num'].apply(classify_season)
-
-    fig = px.line(yearly_data, x='Month', y='Abs_Sales', color='Fiscal_Year',
-                 title='Yearly Trend by Month (Fiscal Year: July-June)',
-                 labels={'Abs_Sales': 'Sales Amount'},
-                 hover_data=['Season', 'Quantity'])
-    
-    # Add reference line for average
-    avg_sales = yearly_data['Abs_Sales'].mean()
-    fig.add_hline(y=avg_sales, line_dash="dot",
-                 annotation_text=f"Average: {avg_sales:,.2f}",
-                 annotation_position="bottom right")
+    with stage('yearly_figure', len(yearly_data)):
+        fig = px.line(yearly_data, x='Month', y='Abs_Sales', color='Fiscal_Year',
+                     title='Yearly Trend by Month (Fiscal Year: July-June)',
+                     labels={'Abs_Sales': 'Sales Amount'},
+                     hover_data=['Season', 'Quantity'],
+                     render_mode='webgl' if len(yearly_data) > webgl_threshold else 'auto')
+        
+        # Add reference line for average
+        avg_sales = yearly_data['Abs_Sales'].mean()
+        fig.add_hline(y=avg_sales, line_dash="dot",
+                     annotation_text=f"Average: {avg_sales:,.2f}",
+                     annotation_position="bottom right")
 
-    fig.update_layout(height=400)
+        fig.update_layout(height=400)
     return fig, yearly_data
 
-def validate_data_structure(df):
-    required_columns = ['Posting Date', 'Item No', 'Description', 
-                       'Source No', 'Name', 'Invoiced Quantity', 'Sales Amount']
-    return all(col in df.columns for col in required_columns)
+FIGURE_BUILDERS = {'weekly': create_weekly_trend, 'monthly': create_monthly_trend, 'yearly': create_yearly_trend}
+
+@st.cache_resource(ttl=3600, max_entries=64, show_spinner=False)
+def cached_figure(view, dataset_id, filters, options, _cube_index):
+    """Figure and its table for one view of a dataset under one filter state.
+
+    The Figure object itself is kept: st.plotly_chart serializes a validated
+    Figure directly, while JSON or a plain dict would be validated again on
+    every rerun. Cached figures are shared between sessions and never modified.
+    """
+    return FIGURE_BUILDERS[view](_cube_index, *filters, **options)
+
+def view_dataset_id(dataset_id, appended, customer="All", fiscal_year="All", year="All", month="All"):
+    """Dataset id a view's cached figure is keyed by.
+
+    A view that no appended row falls in looks exactly as it did in the base
+    dataset, so it keeps the base dataset's id and its cached figure.
+    """
+    if appended is None:
+        return dataset_id
+    touched = appended['touched']
+    for column, value in (('Name', customer), ('Fiscal_Year', fiscal_year), ('Year', year), ('Month', month)):
+        if value != "All":
+            touched = touched[touched[column].astype(str) == str(value)]
+    return dataset_id if len(touched) else appended['base_id']
+
+def trend_figure(view, dataset_id, cube_index, filters, options=None):
+    # Reruns with the same selection reuse the built figure instead of re-running plotly express
+    with stage(f'{view}_figure_cache'):
+        fig, data = cached_figure(view, dataset_id, tuple(filters), options or {}, cube_index)
+    return fig, data
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def load_drilldown(dataset_id, _df, _appended=None):
+    # The family/item hierarchy is built once per dataset and shared by every rerun;
+    # an appended dataset only merges its new rows into the base dataset's
+    if _appended is not None:
+        base = load_drilldown(_appended['base_id'], _appended['base'])
+        with stage('append_drilldown', len(_appended['new_rows'])):
+            return base.appended(_appended['new_rows'])
+    return Drilldown.from_prepared(_df)
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def load_anomalies(dataset_id, _df, _appended=None):
+    # Scored once per dataset; every customer's chart reads its flags from the result.
+    # An appended dataset only rescores the items its new rows belong to.
+    if _appended is not None:
+        base = load_anomalies(_appended['base_id'], _appended['base'])
+        with stage('update_anomalies', len(_appended['new_rows'])) as record:
+            anomalies = update_anomalies(base, _df, _appended['new_rows'])
+            record['rows_out'] = len(anomalies)
+        return anomalies
+
+    with stage('detect_anomalies', len(_df)) as record:
+        anomalies = detect_anomalies(_df)
+        record['rows_out'] = len(anomalies)
+    return anomalies
+
+# Largest families or items shown in the drilldown breakdown chart
+DRILLDOWN_TOP = 25
+
+def create_drilldown_trend(drilldown, customer_filter="All", family="All", item="All", fiscal_year_filter="All"):
+    """Breakdown bar chart one level down plus the weekly trend of the selected node"""
+    with stage('drilldown_lookup') as record:
+        weekly_data = drilldown.weekly(customer_filter, family, item, fiscal_year_filter)
+        breakdown = None
+        if item == "All":
+            breakdown = drilldown.breakdown(customer_filter, family, fiscal_year_filter, top=DRILLDOWN_TOP)
+        record['rows_out'] = len(weekly_data)
+
+    fig_breakdown = None
+    if breakdown is not None and not breakdown.empty:
+        level = 'Family' if family == "All" else 'Item No'
+        title = 'Sales by Product Family' if family == "All" else f'Top {DRILLDOWN_TOP} Items in {family}'
+        fig_breakdown = px.bar(breakdown, x=level, y='Abs_Sales', title=title,
+                               labels={'Abs_Sales': 'Sales Amount'},
+                               hover_data=['Quantity'] + (['Description'] if level == 'Item No' else []))
+        fig_breakdown.update_layout(height=350, xaxis={'tickangle': -45, 'type': 'category'})
+
+    node = item if item != "All" else family if family != "All" else "All Families"
+    fig_weekly = px.line(weekly_data, x='Week_Label', y='Abs_Sales',
+                         title=f'Weekly Sales Trend: {node}',
+                         labels={'Abs_Sales': 'Sales Amount', 'Week_Label': 'Week'})
+    fig_weekly.update_traces(line=dict(width=3), mode='lines+markers', marker=dict(size=6))
+    fig_weekly.update_layout(height=400, xaxis={'tickangle': -45})
+    return fig_breakdown, fig_weekly, weekly_data
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def load_forecaster(dataset_id, _cube):
+    """Forecast models for a dataset, fitted once and kept on disk under the dataset hash"""
+    key = f"{dataset_id}-forecast-v{FORECAST_VERSION}"
+    # The sample data has no content hash, so its models are only kept in memory
+    persist = dataset_id != 'sample'
+    cached = load_dataset(key) if persist else None
+    if cached is not None:
+        return WeeklyForecaster.from_frames(cached)
+
+    with stage('fit_forecasts', len(_cube)):
+        forecaster = WeeklyForecaster.fit(_cube)
+    if persist:
+        store_dataset(key, forecaster.to_frames())
+    return forecaster
+
+def create_yoy_trend(cube, customer_filter="All", fiscal_year_filter="All"):
+    """This fiscal year's weekly sales against the same week numbers of the previous one"""
+    with stage('yoy_metrics') as record:
+        metrics = period_metrics(cube, customer_filter, by_customer=False)
+        record['rows_out'] = len(metrics)
+    if metrics.empty:
+        return None, None, metrics
+
+    fiscal_year = int(fiscal_year_filter) if fiscal_year_filter != "All" else int(metrics['Fiscal_Year'].max())
+    yoy_data = metrics[metrics['Fiscal_Year'] == fiscal_year]
+
+    fig_compare = go.Figure()
+    fig_compare.add_bar(x=yoy_data['Week_Number'], y=yoy_data['Abs_Sales'], name=f'FY {fiscal_year}')
+    fig_compare.add_scatter(x=yoy_data['Week_Number'], y=yoy_data['Sales_LY'], name=f'FY {fiscal_year - 1}',
+                            mode='lines+markers', line=dict(width=3))
+    fig_compare.update_layout(height=400, title=f'Weekly Sales: FY {fiscal_year} vs FY {fiscal_year - 1} (same week number)',
+                              xaxis_title='Fiscal Week Number', yaxis_title='Sales Amount')
+
+    colors = np.where(yoy_data['YoY_Delta'] >= 0, '#4ecdc4', '#ff6b6b')
+    fig_delta = go.Figure(go.Bar(x=yoy_data['Week_Number'], y=yoy_data['YoY_Delta'], marker_color=colors,
+                                 customdata=yoy_data['YoY_Pct'],
+                                 hovertemplate='Week %{x}<br>Change: %{y:,.2f}<br>YoY: %{customdata:.1f}%<extra></extra>'))
+    fig_delta.update_layout(height=350, title='Change vs Same Week Last Fiscal Year',
+                            xaxis_title='Fiscal Week Number', yaxis_title='Sales Change')
+    return fig_compare, fig_delta, yoy_data
+
+def create_rolling_trend(cube, customer_filter="All"):
+    """Trailing 4/13/52-week sales over time and fiscal-year-to-date curves per fiscal year"""
+    with stage('rolling_metrics') as record:
+        metrics = period_metrics(cube, customer_filter, by_customer=False)
+        record['rows_out'] = len(metrics)
+    if metrics.empty:
+        return None, None, metrics
+
+    rolling_columns = [f'Rolling_{window}' for window in ROLLING_WINDOWS]
+    rolling = metrics.melt(id_vars=['Fiscal_Week_Start', 'Week_Label'], value_vars=rolling_columns,
+                           var_name='Window', value_name='Sales')
+    rolling['Window'] = rolling['Window'].str.replace('Rolling_', '') + ' weeks'
+    fig_rolling = px.line(rolling, x='Fiscal_Week_Start', y='Sales', color='Window',
+                          title='Trailing Sales (4, 13 and 52 weeks)',
+                          labels={'Fiscal_Week_Start': 'Week Starting', 'Sales': 'Sales Amount'},
+                          hover_data=['Week_Label'])
+    fig_rolling.update_layout(height=400)
+
+    fig_fytd = px.line(metrics, x='Week_Number', y='FYTD', color=metrics['Fiscal_Year'].astype(str),
+                       title='Cumulative Fiscal-Year-to-Date Sales',
+                       labels={'Week_Number': 'Fiscal Week Number', 'FYTD': 'Sales Amount', 'color': 'Fiscal Year'},
+                       hover_data=['FYTD_YoY_Pct'])
+    fig_fytd.update_layout(height=400)
+    return fig_rolling, fig_fytd, metrics
+
+def source_dataset_key(source):
+    """Content-hash key for an upload or local file, hashed once per session"""
+    if isinstance(source, Path):
+        stat = source.stat()
+        identity = (str(source), stat.st_size, stat.st_mtime_ns)
+    else:
+        identity = (source.name, source.size, getattr(source, 'file_id', None))
+
+    keys = st.session_state.setdefault('dataset_keys', {})
+    if identity not in keys:
+        keys[identity] = source_key(source)
+    return keys[identity]
+
+def sources_dataset_key(sources):
+    """Dataset key for one or many sources; a set of files is keyed by their sorted file keys"""
+    keys = sorted(source_dataset_key(source) for source in sources)
+    if len(keys) == 1:
+        return keys[0]
+    return dataset_key("\n".join(keys).encode())
+
+def _is_excel(source):
+    return Path(source.name).suffix.lower() in EXCEL_SUFFIXES
+
+@st.cache_resource(show_spinner=False)
+def shared_datasets():
+    # One registry per server process, so sessions loading the same file share one copy
+    return DatasetRegistry()
+
+def session_dataset(slot, key, loader):
+    """Frames of a shared dataset, leased by this session until it switches dataset or ends"""
+    leases = st.session_state.setdefault('dataset_leases', {})
+    lease = leases.get(slot)
+    if lease is None or lease.key != key:
+        lease = shared_datasets().acquire(key, loader)
+        leases[slot] = lease
+    return lease.frames
+
+def release_dataset(slot):
+    st.session_state.setdefault('dataset_leases', {}).pop(slot, None)
+
+def build_prepared_dataset(key, sources, streaming=False):
+    """Prepared ledger, cube and skipped sheets for a dataset key, from the on-disk cache when possible.
+
+    In streaming mode only the cube of the single source is built (chunk by chunk)
+    and the ledger is None. Workbooks and sets of files are read sheet by sheet in
+    parallel; sheets without the required columns are skipped and reported as
+    {label: missing columns}, and rows with an unreadable Posting Date are
+    counted in invalid_dates.
+    """
+    cached = load_dataset(key)
+    if cached is not None:
+        skipped = cached['skipped'].set_index('Sheet')['Missing'].to_dict() if 'skipped' in cached else {}
+        invalid = int(cached['dates']['invalid_dates'].iloc[0]) if 'dates' in cached else 0
+        return {'prepared': cached.get('prepared'), 'cube': cached['cube'], 'skipped': skipped,
+                'invalid_dates': invalid}
+
+    if streaming:
+        with stage('stream_cube') as record:
+            cube = stream_cube(sources[0])
+            record['rows_out'] = len(cube)
+        invalid = invalid_dates(cube)
+        store_dataset(key, {'cube': cube, 'dates': pd.DataFrame({'invalid_dates': [invalid]})})
+        return {'prepared': None, 'cube': cube, 'skipped': {}, 'invalid_dates': invalid}
+
+    skipped = {}
+    if len(sources) == 1 and not _is_excel(sources[0]):
+        with stage('read_ledger') as record:
+            uploaded_df = load_ledger(sources[0])
+            record['rows_out'] = len(uploaded_df)
+        if not validate_data_structure(uploaded_df):
+            raise ValueError(f"Missing required columns. Required: {', '.join(REQUIRED_COLUMNS)}")
+        # Not the cached prepare_data: st.cache_data would keep a second copy of the ledger
+        with stage('prepare', len(uploaded_df)) as record:
+            df = prepare_ledger(uploaded_df)
+            record['rows_out'] = len(df)
+    else:
+        with stage('ingest', len(sources)) as record:
+            df, skipped = load_ledgers(sources)
+            record['rows_out'] = len(df)
+
+    invalid = invalid_dates(df)
+    with stage('build_cube', len(df)) as record:
+        cube = build_cube(df)
+        record['rows_out'] = len(cube)
+    frames = {'prepared': df, 'cube': cube, 'dates': pd.DataFrame({'invalid_dates': [invalid]})}
+    if skipped:
+        frames['skipped'] = pd.DataFrame({'Sheet': list(skipped),
+                                          'Missing': [', '.join(columns) for columns in skipped.values()]})
+    with stage('store_dataset'):
+        store_dataset(key, frames)
+    return {'prepared': df, 'cube': cube, 'skipped': {label: ', '.join(columns) for label, columns in skipped.items()},
+            'invalid_dates': invalid}
+
+def load_delta(appended_key, prepared, delta_source, earlier=None):
+    """Prepared rows a delta file adds, cached on disk by themselves instead of as a merged ledger"""
+    delta_key = f"{appended_key}-delta"
+    cached = load_dataset(delta_key)
+    if cached is not None:
+        return cached['delta'], cached['report'].iloc[0].to_dict()
+
+    new_rows = load_ledger(delta_source)
+    if not validate_data_structure(new_rows):
+        raise ValueError(f"Missing required columns. Required: {', '.join(REQUIRED_COLUMNS)}")
+    with stage('prepare_delta', len(new_rows)) as record:
+        delta, report = prepare_rows(prepared, new_rows, earlier)
+        record['rows_out'] = len(delta)
+    store_dataset(delta_key, {'delta': delta, 'report': pd.DataFrame([report])})
+    return delta, report
+
+def build_appended_dataset(start, chain, delta_sources):
+    """The start dataset with each pending delta file stacked on it in turn.
+
+    start is the base dataset, or a shorter chain of the same files this session
+    already holds, and chain the dataset key after each pending delta. Deltas are
+    prepared once and then read back from disk, and however many are pending they
+    are merged into the ledger and cube in a single pass.
+    """
+    report = dict(start.get('report') or {'rows_added': 0, 'duplicates_dropped': 0, 'invalid_dates': 0})
+    deltas = []
+    for appended_key, source in zip(chain, delta_sources):
+        earlier = pd.concat(deltas, ignore_index=True) if deltas else None
+        delta, counts = load_delta(appended_key, start['prepared'], source, earlier)
+        deltas.append(delta)
+        report = {name: report[name] + counts[name] for name in report}
+
+    with stage('merge_rows', len(start['prepared'])) as record:
+        df, cube, new = merge_rows(start['prepared'], start['cube'], deltas)
+        record['rows_out'] = len(new)
+    # Rows added since the base dataset, which derived caches are updated from
+    new_rows = pd.concat([start['new_rows'], new], ignore_index=True) if 'new_rows' in start else new
+    return {'prepared': df, 'cube': cube, 'report': report, 'new_rows': new_rows, 'touched': touched_cells(new_rows)}
+
+def appended_dataset(base_id, base, delta_sources):
+    """Dataset key and frames of the base dataset with delta files appended in upload order.
+
+    Each delta is stacked on the ones before it, so daily files can keep being
+    added. Only the full chain is leased; when this session already holds a
+    shorter chain of the same files, the new files are appended to that.
+    """
+    chain, previous = [], base_id
+    for source in delta_sources:
+        previous = dataset_key(f"{previous}+{source_dataset_key(source)}".encode())
+        chain.append(previous)
+
+    held = st.session_state.setdefault('dataset_leases', {}).get('appended')
+    start, done = base, 0
+    if held is not None and held.key in chain:
+        start, done = held.frames, chain.index(held.key) + 1
+    return chain[-1], session_dataset('appended', chain[-1],
+                                      lambda: build_appended_dataset(start, chain[done:], delta_sources[done:]))
 
 # Main app logic with performance optimizations
-def main():
+def render_dashboard():
     # Load and prepare data
-    with st.spinner("Loading data..."):
+    with st.spinner("Loading data..."), stage('sample_data') as record:
         df = load_sample_data()
         df = prepare_data(df)
+        record['rows_out'] = len(df)
 
     # File upload section
     st.sidebar.header("📁 Data Upload")
-    uploaded_file = st.sidebar.file_uploader("Upload Excel file", type=['xlsx', 'xls'])
+    uploaded_files = st.sidebar.file_uploader("Upload ledgers (Excel, CSV, Parquet or Arrow)", type=LEDGER_FILE_TYPES,
+                                              accept_multiple_files=True)
+
+    # Local Parquet/Arrow files are memory-mapped instead of uploaded
+    data_dir = st.sidebar.text_input("Or load from a local directory", "")
+    local_sources = []
+    if data_dir:
+        local_files = list_ledger_files(data_dir)
+        if local_files:
+            if len(local_files) > 1 and st.sidebar.checkbox("Load every file in the directory", key="load_all"):
+                local_sources = local_files
+            else:
+                local_sources = [st.sidebar.selectbox("Ledger file", local_files, format_func=lambda path: path.name)]
+        else:
+            st.sidebar.warning("No ledger files found in that directory.")
+
+    cube = None
+    dataset_id = 'sample'
+    # Base dataset id, touched cells and new rows when delta files are appended
+    appended = None
+    sources = uploaded_files or local_sources
+
+    # Streaming keeps only the aggregates, for a CSV/Parquet/Arrow ledger larger than RAM
+    streaming = False
+    if len(sources) == 1 and not _is_excel(sources[0]):
+        streaming = st.sidebar.checkbox("Stream file (aggregates only)", key="streaming")
 
-    if uploaded_file:
+    if sources:
         try:
-            with st.spinner("Processing uploaded file..."):
-                uploaded_df = pd.read_excel(uploaded_file)
-                if validate_data_structure(uploaded_df):
-                    df = prepare_data(uploaded_df)  # Re-prepare with new data
-                    st.sidebar.success("✅ File uploaded successfully!")
-                else:
-                    st.sidebar.error("❌ Missing required columns.")
-                    st.sidebar.info("Required: Posting Date, Item No, Description, Source No, Name, Invoiced Quantity, Sales Amount")
-                    return
+            with st.spinner("Processing uploaded files..."):
+                with stage('hash_source', len(sources)):
+                    key = sources_dataset_key(sources)
+                dataset_id = f"{key}-stream" if streaming else key
+                with stage('load_dataset') as record:
+                    dataset = session_dataset('base', dataset_id,
+                                              lambda: build_prepared_dataset(dataset_id, sources, streaming))
+                    df, cube, skipped = dataset['prepared'], dataset['cube'], dataset['skipped']
+                    record['rows_out'] = len(cube)
+                st.sidebar.success(f"✅ {len(sources)} file(s) loaded successfully!")
+                for label, missing in skipped.items():
+                    st.sidebar.warning(f"⚠️ Skipped {label}: missing {missing}")
+                if dataset['invalid_dates']:
+                    st.sidebar.warning(f"⚠️ Left out {dataset['invalid_dates']:,} rows with an unreadable Posting Date")
         except Exception as e:
             st.sidebar.error(f"❌ Error: {str(e)}")
             return
 
+        # Daily drops are appended to the loaded history instead of re-uploading it
+        append_files = []
+        if not streaming:
+            append_files = st.sidebar.file_uploader("Append new postings", type=LEDGER_FILE_TYPES,
+                                                    accept_multiple_files=True, key="append_files")
+            if append_files:
+                try:
+                    with st.spinner("Appending new postings..."), stage('append_dataset'):
+                        appended_id, dataset = appended_dataset(dataset_id, {'prepared': df, 'cube': cube},
+                                                                append_files)
+                    appended = {'base_id': dataset_id, 'base': df,
+                                'new_rows': dataset['new_rows'], 'touched': dataset['touched']}
+                    df, cube, report = dataset['prepared'], dataset['cube'], dataset['report']
+                    dataset_id = appended_id
+                    st.sidebar.success(f"➕ Appended {report['rows_added']:,} rows from {len(append_files)} file(s) "
+                                       f"({report['duplicates_dropped']:,} duplicates skipped)")
+                    if report['invalid_dates']:
+                        st.sidebar.warning(f"⚠️ Left out {report['invalid_dates']:,} appended rows "
+                                           f"with an unreadable Posting Date")
+                except Exception as e:
+                    st.sidebar.error(f"❌ Append error: {str(e)}")
+        if not append_files:
+            release_dataset('appended')
+    else:
+        # Dropping the leases lets the registry free datasets no other session uses
+        release_dataset('base')
+        release_dataset('appended')
+
+    with st.sidebar.expander("🧠 Memory usage", expanded=False):
+        st.dataframe(memory_report(df if df is not None else cube), use_container_width=True)
+        st.caption("Uncompacted MB is the same frame before categorical and narrow integer dtypes")
+        st.caption("Datasets shared across sessions")
+        st.dataframe(shared_datasets().stats(), use_container_width=True, hide_index=True)
+
+    # Aggregate once per dataset, every chart below reads from the cube
+    with st.spinner("Aggregating data..."):
+        if cube is None:
+            with stage('cube', len(df)) as record:
+                cube = load_cube(df)
+                record['rows_out'] = len(cube)
+        with stage('filter_index', len(cube)):
+            cube_index = load_filter_index(dataset_id, cube)
+
     # Extract filter options
     with st.spinner("Preparing filters..."):
-        customers = ["All"] + sorted(df['Name'].unique().tolist())
-        years = ["All"] + sorted([str(year) for year in df['Year'].unique()], reverse=True)
-        fiscal_years = ["All"] + sorted([str(fy) for fy in df['Fiscal_Year'].unique()], reverse=True)
+        customers = ["All"] + sorted(cube['Name'].unique().tolist())
+        years = ["All"] + sorted([str(year) for year in cube['Year'].unique()], reverse=True)
+        fiscal_years = ["All"] + sorted([str(fy) for fy in cube['Fiscal_Year'].unique()], reverse=True)
         months = ["All"] + ['January', 'February', 'March', 'April', 'May', 'June',
                           'July', 'August', 'September', 'October', 'November', 'December']
     
@@ -254,11 +633,20 @@ def main():
     selected_year = st.sidebar.selectbox("Calendar Year", years, key="year")
     selected_month = st.sidebar.selectbox("Month", months, key="month")
 
+    st.sidebar.subheader("Chart Rendering")
+    webgl_threshold = st.sidebar.number_input("Use WebGL above (points)", min_value=10,
+                                              value=WEBGL_POINT_THRESHOLD, step=100, key="webgl_threshold")
+    max_points = st.sidebar.number_input("Downsample WebGL charts to (points)", min_value=50,
+                                         value=MAX_CHART_POINTS, step=100, key="max_points")
+
+    render_export_panel(dataset_id, cube, customers)
+
     # Display current selection
     st.markdown(f"### 📊 Analysis for: **{selected_customer if selected_customer != 'All' else 'All Customers'}**")
     
     # Create tabs for different trend views
-    tab1, tab2, tab3 = st.tabs(["📅 Weekly Trend", "📊 Monthly Trend", "📈 Yearly Trend"])
+    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["📅 Weekly Trend", "📊 Monthly Trend", "📈 Yearly Trend",
+                                                  "🔎 Product Drilldown", "📆 Year over Year", "📉 Rolling & FYTD"])
     
     with tab1:
         st.markdown("### Weekly Sales Trend")
@@ -275,19 +663,48 @@ def main():
         
         if active_filters:
             st.info(f"🔍 Active filters: {' | '.join(active_filters)}")
+
+        # Forecasts continue the latest weeks, so they only apply when those are on screen
+        forecast = None
+        latest_fiscal_year = fiscal_years[1] if len(fiscal_years) > 1 else "All"
+        latest_weeks = (selected_year == "All" and selected_month == "All"
+                        and selected_fiscal_year in ("All", latest_fiscal_year))
+        if not cube.empty and latest_weeks and st.checkbox(f"Show {FORECAST_WEEKS}-week forecast", key="show_forecast"):
+            with st.spinner("Fitting forecasts..."):
+                forecast = load_forecaster(dataset_id, cube).forecast(selected_customer)
+
+        # Unusual weeks are scored per item from signed amounts, which only the row-level ledger has
+        anomalies = flags = None
+        if df is not None and not df.empty and st.checkbox("Highlight unusual weeks", key="show_anomalies"):
+            with st.spinner("Scoring item weeks..."):
+                anomalies = load_anomalies(dataset_id, df, appended)
+                flags = weekly_flags(anomalies, selected_customer)
         
         with st.spinner("Generating weekly trend..."):
-            fig_weekly, weekly_data = create_weekly_trend(
-                df, selected_customer, selected_year, selected_month, selected_fiscal_year
+            fig_weekly, weekly_data = trend_figure(
+                'weekly', view_dataset_id(dataset_id, appended, selected_customer, selected_fiscal_year,
+                                          selected_year, selected_month), cube_index,
+                [selected_customer, selected_year, selected_month, selected_fiscal_year],
+                {'webgl_threshold': webgl_threshold, 'max_points': max_points, 'forecast': forecast,
+                 'anomaly_flags': flags}
             )
-            st.plotly_chart(fig_weekly, use_container_width=True)
+            with stage('weekly_render'):
+                st.plotly_chart(fig_weekly, use_container_width=True)
         
         if not weekly_data.empty:
             with st.expander("📋 Weekly Summary Table", expanded=False):
-                summary_df = weekly_data[['Week_Number', 'Fiscal_Week_Str', 'Abs_Sales', 'Quantity']].copy()
-                summary_df.columns = ['Week #', 'Week Start', 'Sales Amount', 'Quantity']
-                summary_df['Sales Amount'] = summary_df['Sales Amount'].round(2)
-                st.dataframe(summary_df, use_container_width=True)
+                st.dataframe(summary_table(weekly_data, 'weekly'), use_container_width=True)
+
+        if anomalies is not None and not weekly_data.empty:
+            shown = anomalies[anomalies['Fiscal_Week_Start'].isin(weekly_data['Fiscal_Week_Start'])]
+            if selected_customer != "All":
+                shown = shown[shown['Name'] == selected_customer]
+            with st.expander(f"⚠️ Unusual Item Weeks ({len(shown)})", expanded=False):
+                st.caption(f"Item sales and returns scored separately against the item's recent weeks; "
+                           f"flagged above a robust z-score of {Z_THRESHOLD}.")
+                unusual_df = shown[['Name', 'Item No', 'Fiscal_Week_Start', 'Measure', 'Amount', 'Median', 'Z_Score']].copy()
+                unusual_df.columns = ['Customer', 'Item', 'Week Start', 'Measure', 'Amount', 'Typical', 'Z-Score']
+                st.dataframe(unusual_df.round(2), use_container_width=True, hide_index=True)
     
     with tab2:
         st.markdown("### Monthly Sales Trend")
@@ -295,15 +712,14 @@ def main():
             st.info(f"🔍 Active filter: Customer: {selected_customer}")
         
         with st.spinner("Generating monthly trend..."):
-            fig_monthly, monthly_data = create_monthly_trend(df, selected_customer)
-            st.plotly_chart(fig_monthly, use_container_width=True)
+            fig_monthly, monthly_data = trend_figure('monthly', view_dataset_id(dataset_id, appended, selected_customer),
+                                                     cube_index, [selected_customer])
+            with stage('monthly_render'):
+                st.plotly_chart(fig_monthly, use_container_width=True)
         
         if not monthly_data.empty:
             with st.expander("📋 Monthly Summary Table", expanded=False):
-                summary_df = monthly_data[['Month', 'Season', 'Abs_Sales', 'Quantity']].copy()
-                summary_df.columns = ['Month', 'Season', 'Sales Amount', 'Quantity']
-                summary_df['Sales Amount'] = summary_df['Sales Amount'].round(2)
-                st.dataframe(summary_df, use_container_width=True)
+                st.dataframe(summary_table(monthly_data, 'monthly'), use_container_width=True)
     
     with tab3:
         st.markdown("### Yearly Sales Trend")
@@ -311,15 +727,146 @@ def main():
             st.info(f"🔍 Active filter: Customer: {selected_customer}")
         
         with st.spinner("Generating yearly trend..."):
-            fig_yearly, yearly_data = create_yearly_trend(df, selected_customer)
-            st.plotly_chart(fig_yearly, use_container_width=True)
+            fig_yearly, yearly_data = trend_figure('yearly', view_dataset_id(dataset_id, appended, selected_customer),
+                                                   cube_index, [selected_customer],
+                                                   {'webgl_threshold': webgl_threshold})
+            with stage('yearly_render'):
+                st.plotly_chart(fig_yearly, use_container_width=True)
         
         if not yearly_data.empty:
             with st.expander("📋 Yearly Summary Table", expanded=False):
-                summary_df = yearly_data[['Fiscal_Year', 'Month', 'Season', 'Abs_Sales', 'Quantity']].copy()
-                summary_df.columns = ['Fiscal Year', 'Month', 'Season', 'Sales Amount', 'Quantity']
-                summary_df['Sales Amount'] = summary_df['Sales Amount'].round(2)
-                st.dataframe(summary_df, use_container_width=True)
+                st.dataframe(summary_table(yearly_data, 'yearly'), use_container_width=True)
+
+    with tab4:
+        render_drilldown_tab(df, dataset_id, appended, selected_customer, selected_fiscal_year)
+
+    with tab5:
+        st.markdown("### Year-over-Year Comparison")
+        with st.spinner("Comparing fiscal years..."):
+            fig_compare, fig_delta, yoy_data = create_yoy_trend(cube_index, selected_customer, selected_fiscal_year)
+        if yoy_data.empty:
+            st.info("No data available for selected filters")
+        else:
+            st.plotly_chart(fig_compare, use_container_width=True)
+            st.plotly_chart(fig_delta, use_container_width=True)
+            with st.expander("📋 Year-over-Year Table", expanded=False):
+                summary_df = yoy_data[['Week_Number', 'Fiscal_Week_Str', 'Abs_Sales', 'Sales_LY',
+                                       'YoY_Delta', 'YoY_Pct', 'FYTD', 'FYTD_LY', 'FYTD_YoY_Pct']].copy()
+                summary_df.columns = ['Week #', 'Week Start', 'Sales Amount', 'Same Week LY', 'Change',
+                                      'Change %', 'FYTD', 'FYTD LY', 'FYTD Change %']
+                st.dataframe(summary_df.round(2), use_container_width=True)
+
+    with tab6:
+        st.markdown("### Rolling Windows and Fiscal Year to Date")
+        with st.spinner("Computing rolling windows..."):
+            fig_rolling, fig_fytd, rolling_data = create_rolling_trend(cube_index, selected_customer)
+        if rolling_data.empty:
+            st.info("No data available for selected filters")
+        else:
+            st.plotly_chart(fig_rolling, use_container_width=True)
+            st.plotly_chart(fig_fytd, use_container_width=True)
+
+def render_drilldown_tab(df, dataset_id, appended, selected_customer, selected_fiscal_year):
+    st.markdown("### Product Family and Item Drilldown")
+    if df is None:
+        st.info("Item drilldown needs the row-level ledger; turn off streaming to use it.")
+        return
+
+    with st.spinner("Indexing products..."), stage('drilldown_index'):
+        drilldown = load_drilldown(dataset_id, df, appended)
+
+    families = ["All"] + drilldown.family_names(selected_customer, selected_fiscal_year)
+    col1, col2 = st.columns(2)
+    selected_family = col1.selectbox("Product Family", families, key="family")
+    items = ["All"]
+    if selected_family != "All":
+        items += drilldown.item_names(selected_customer, selected_family, selected_fiscal_year)
+    selected_item = col2.selectbox("Item", items, key="item")
+
+    with st.spinner("Generating drilldown..."):
+        fig_breakdown, fig_drill, drill_data = create_drilldown_trend(
+            drilldown, selected_customer, selected_family, selected_item, selected_fiscal_year
+        )
+        if fig_breakdown is not None:
+            st.plotly_chart(fig_breakdown, use_container_width=True)
+        st.plotly_chart(fig_drill, use_container_width=True)
+
+    if not drill_data.empty:
+        with st.expander("📋 Drilldown Weekly Table", expanded=False):
+            st.dataframe(summary_table(drill_data, 'weekly'), use_container_width=True)
+
+def render_export_panel(dataset_id, cube, customers):
+    """Sidebar export of every customer's summaries (and optional chart images) for download"""
+    with st.sidebar.expander("📤 Export all customers", expanded=False):
+        export_format = st.selectbox("Format", EXPORT_FORMATS, key="export_format",
+                                     format_func=lambda name: {'xlsx': 'Excel workbook', 'parquet': 'Parquet (zip)',
+                                                               'csv': 'CSV (zip)'}[name])
+        charts = st.checkbox("Include chart images", key="export_charts")
+        request = (dataset_id, export_format, charts)
+
+        if st.button("Prepare export", key="export_run"):
+            # One directory per session, so concurrent exports never share files
+            session_id = st.session_state.setdefault('export_session', uuid.uuid4().hex[:12])
+            export_dir = EXPORT_DIR / session_id
+            shutil.rmtree(export_dir, ignore_errors=True)
+            export_dir.mkdir(parents=True)
+            files = {'summaries': export_dir / f"sales_summaries{EXPORT_SUFFIXES[export_format]}"}
+            with st.spinner("Exporting summaries..."), stage('export_summaries', len(cube)) as record:
+                record['rows_out'] = sum(export_summaries(cube, files['summaries'], export_format).values())
+            if charts:
+                files['charts'] = export_dir / 'sales_charts.zip'
+                with st.spinner("Rendering charts..."), stage('export_charts', len(customers)) as record:
+                    record['rows_out'] = export_charts(cube, customers, files['charts'])
+            st.session_state['export'] = {'request': request, 'files': files}
+            evict(EXPORT_DIR, EXPORT_MAX_BYTES, keep=[export_dir])
+
+        # Downloads only apply to the dataset and options they were prepared for
+        prepared = st.session_state.get('export')
+        if prepared and prepared['request'] == request and all(path.exists() for path in prepared['files'].values()):
+            for name, path in prepared['files'].items():
+                with path.open('rb') as handle:
+                    st.download_button(f"⬇️ Download {name}", handle, file_name=path.name, key=f"export_download_{name}")
+
+
+def diagnostics_controls():
+    """Sidebar switches for the opt-in diagnostics panel, drawn below the filters"""
+    st.sidebar.header("🩺 Diagnostics")
+    if st.sidebar.checkbox("Show stage timings", key="diagnostics"):
+        st.sidebar.checkbox("Trace peak memory (slower)", key="diagnostics_memory")
+        if st.sidebar.checkbox("Append timings to a JSON lines log", key="diagnostics_log"):
+            st.sidebar.caption(f"Written to {DIAGNOSTICS_LOG}")
+
+def diagnostics_options():
+    # Widget values from the previous interaction are already in session_state,
+    # so the probe can be set up before the controls are drawn
+    state = st.session_state
+    if not state.get('diagnostics'):
+        return None
+    log_path = DIAGNOSTICS_LOG if state.get('diagnostics_log') else None
+    session_id = state.setdefault('diagnostics_session', uuid.uuid4().hex[:12])
+    return {'trace_memory': state.get('diagnostics_memory', False), 'log_path': log_path,
+            'context': {'session': session_id}}
+
+def render_diagnostics(probe, seconds):
+    with st.sidebar.expander("⏱️ Stage timings (this rerun)", expanded=True):
+        st.caption(f"Total rerun: {seconds:.3f}s")
+        timings = probe.to_frame()
+        # Indent nested stages so their parent is visible
+        timings['stage'] = ['  ' * depth + name for name, depth in zip(timings['stage'], timings['depth'])]
+        st.dataframe(timings.drop(columns='depth'), use_container_width=True, hide_index=True)
+
+def main():
+    options = diagnostics_options()
+    if options is None:
+        render_dashboard()
+        diagnostics_controls()
+        return
+
+    with Instrumentation(**options) as probe:
+        with stage('rerun') as record:
+            render_dashboard()
+    diagnostics_controls()
+    render_diagnostics(probe, record['seconds'])
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,139 @@
+"""Build weekly, monthly and yearly trend reports from a ledger file without Streamlit.
+
+    python trend_cli.py ledger.xlsx --output reports --all-customers --workers 8 --charts
+
+Writes one table per view and customer (plus PNG charts with --charts) into
+the output directory. With --export xlsx|parquet|csv every customer's
+summaries go into a single file instead, written in one streaming pass:
+
+    python trend_cli.py ledger.xlsx --output reports --export xlsx --charts --workers 8
+
+Neither streamlit nor plotly is imported.
+"""
+import argparse
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from cube import build_cube
+from data_loader import DEFAULT_CHUNK_ROWS, load_ledger
+from export import (EXPORT_FORMATS, EXPORT_SUFFIXES, customer_tables, export_charts, export_summaries, file_stem,
+                    init_worker, render_charts, unique_stems, worker_index)
+from filter_index import FilterIndex
+from preparation import invalid_dates, prepare_ledger
+from streaming import stream_cube
+from trend_tables import summary_table, validate_data_structure
+
+TABLE_FORMATS = ('csv', 'parquet')
+
+
+def build_ledger_cube(path, stream=False, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Aggregate cube for a ledger file, optionally streamed chunk by chunk.
+
+    Rows with an unreadable Posting Date are counted in the cube's attrs (see preparation.invalid_dates).
+    """
+    if stream:
+        return stream_cube(path, chunk_rows)
+
+    ledger = load_ledger(path)
+    if not validate_data_structure(ledger):
+        raise ValueError(f"{path} is missing required columns")
+    prepared = prepare_ledger(ledger)
+    cube = build_cube(prepared)
+    cube.attrs['invalid_dates'] = invalid_dates(prepared)
+    return cube
+
+
+def _write_table(table, path, table_format):
+    if table_format == 'parquet':
+        table.to_parquet(path.with_suffix('.parquet'), index=False)
+    else:
+        table.to_csv(path.with_suffix('.csv'), index=False)
+
+
+def _save_charts(tables, customer, stem):
+    for view, png in render_charts(tables, customer).items():
+        stem.with_name(f"{stem.name}_{view}.png").write_bytes(png)
+
+
+def write_customer_report(cube, customer, output_dir, table_format='csv', charts=False, stem=None):
+    """Write the weekly, monthly and yearly tables (and optional charts) for one customer"""
+    tables = customer_tables(cube, customer)
+    stem = Path(output_dir) / (stem or file_stem(customer))
+    for view, table in tables.items():
+        # The same columns and names as the dashboard tables and the combined export
+        _write_table(summary_table(table, view), stem.with_name(f"{stem.name}_{view}"), table_format)
+    if charts:
+        _save_charts(tables, customer, stem)
+    return customer
+
+
+def _worker_report(customer, output_dir, table_format, charts, stem):
+    return write_customer_report(worker_index(), customer, output_dir, table_format, charts, stem)
+
+
+def write_reports(cube, customers, output_dir, table_format='csv', charts=False, workers=1):
+    """Write reports for many customers, across a process pool when workers > 1"""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    # Every customer gets its own stem, so no report overwrites another
+    stems = unique_stems(customers)
+
+    if workers <= 1:
+        index = FilterIndex(cube)
+        return [write_customer_report(index, customer, output_dir, table_format, charts, stem)
+                for customer, stem in stems.items()]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(cube,)) as pool:
+        futures = [pool.submit(_worker_report, customer, output_dir, table_format, charts, stem)
+                   for customer, stem in stems.items()]
+        return [future.result() for future in futures]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build sales trend reports from a ledger file.")
+    parser.add_argument('ledger', type=Path, help="Excel, CSV, Parquet or Arrow ledger")
+    parser.add_argument('-o', '--output', type=Path, default=Path('reports'), help="output directory")
+    parser.add_argument('-c', '--customer', action='append', default=[],
+                        help="customer to report on (repeatable, default: All)")
+    parser.add_argument('--all-customers', action='store_true',
+                        help="report on every customer as well as All")
+    parser.add_argument('--format', choices=TABLE_FORMATS, default='csv', help="table file format")
+    parser.add_argument('--charts', action='store_true', help="also write PNG charts")
+    parser.add_argument('--export', choices=EXPORT_FORMATS,
+                        help="write every customer's summaries to one file (and charts to charts.zip) "
+                             "instead of per-customer reports")
+    parser.add_argument('--workers', type=int, default=1, help="worker processes for per-customer reports")
+    parser.add_argument('--stream', action='store_true',
+                        help="aggregate CSV/Parquet/Arrow ledgers chunk by chunk")
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    cube = build_ledger_cube(args.ledger, args.stream, args.chunk_rows)
+    if invalid_dates(cube):
+        print(f"Left out {invalid_dates(cube)} rows with an unreadable Posting Date", file=sys.stderr)
+
+    if args.export:
+        args.output.mkdir(parents=True, exist_ok=True)
+        target = args.output / f"summaries{EXPORT_SUFFIXES[args.export]}"
+        written = export_summaries(cube, target, args.export)
+        print(f"Wrote {sum(written.values())} summary rows to {target}")
+        if args.charts:
+            customers = ["All"] + sorted(cube['Name'].unique().tolist())
+            images = export_charts(cube, customers, args.output / 'charts.zip', max(args.workers, 1))
+            print(f"Wrote {images} chart(s) to {args.output / 'charts.zip'}")
+        return
+
+    customers = args.customer or ["All"]
+    if args.all_customers:
+        customers = ["All"] + sorted(cube['Name'].unique().tolist())
+
+    written = write_reports(cube, customers, args.output, args.format, args.charts, args.workers)
+    print(f"Wrote reports for {len(written)} customer(s) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+
+from cube import rollup
+from data_loader import REQUIRED_COLUMNS
+from filter_index import FilterIndex
+from fiscal_calendar import SEASON_BY_MONTH, DEFAULT_SEASON
+from instrumentation import stage
+from schema import equals_mask
+
+SEASON_COLORS = {'High Season': '#ff6b6b', 'Moderate Season': '#4ecdc4', 'Low Season': '#45b7d1'}
+
+
+def classify_season(month_num):
+    # Simple lookup is faster than multiple ifs
+    return SEASON_BY_MONTH.get(month_num, DEFAULT_SEASON)
+
+
+def validate_data_structure(df):
+    return all(col in df.columns for col in REQUIRED_COLUMNS)
+
+
+def _frame_rows(df):
+    return len(df.frame) if isinstance(df, FilterIndex) else len(df)
+
+
+def _active_filter(value, cast=None):
+    if not value or value == "All":
+        return None
+    return cast(value) if cast else value
+
+
+# Optimized filtering function
+def get_filtered_data(df, customer_filter=None, year_filter=None, month_filter=None, fiscal_year_filter=None):
+    """Apply all filters to the dataframe (or FilterIndex) efficiently"""
+    if isinstance(df, FilterIndex):
+        # Posting-list intersection with an LRU of recent selections
+        return df.select(
+            Name=_active_filter(customer_filter),
+            Year=_active_filter(year_filter, int),
+            Month=_active_filter(month_filter),
+            Fiscal_Year=_active_filter(fiscal_year_filter, int),
+        )
+
+    # Categorical columns are compared on their integer codes
+    mask = np.ones(len(df), dtype=bool)
+
+    if customer_filter and customer_filter != "All":
+        mask &= equals_mask(df['Name'], customer_filter)
+
+    if year_filter and year_filter != "All":
+        mask &= (df['Year'].to_numpy() == int(year_filter))
+
+    if month_filter and month_filter != "All":
+        mask &= equals_mask(df['Month'], month_filter)
+
+    if fiscal_year_filter and fiscal_year_filter != "All":
+        mask &= (df['Fiscal_Year'].to_numpy() == int(fiscal_year_filter))
+
+    return df[mask].copy()  # Return a copy to avoid SettingWithCopyWarning
+
+
+# Group keys and sort order of each trend view
+TREND_VIEWS = {
+    'weekly': (['Fiscal_Week_Str', 'Week_Number', 'Fiscal_Week_Start', 'Week_Label'], ['Fiscal_Week_Start']),
+    'monthly': (['Month', 'Month_Num', 'Season'], ['Month_Num']),
+    'yearly': (['Fiscal_Year', 'Month', 'Month_Num', 'Season'], ['Fiscal_Year', 'Month_Num']),
+}
+
+# Columns of each view's summary table and their display names
+SUMMARY_COLUMNS = {
+    'weekly': {'Week_Number': 'Week #', 'Fiscal_Week_Str': 'Week Start', 'Abs_Sales': 'Sales Amount', 'Quantity': 'Quantity'},
+    'monthly': {'Month': 'Month', 'Season': 'Season', 'Abs_Sales': 'Sales Amount', 'Quantity': 'Quantity'},
+    'yearly': {'Fiscal_Year': 'Fiscal Year', 'Month': 'Month', 'Season': 'Season',
+               'Abs_Sales': 'Sales Amount', 'Quantity': 'Quantity'},
+}
+
+
+# Trend tables are rolled up from the aggregate cube (or its FilterIndex), never the raw rows
+def _trend_table(view, cube, filters, empty_frame=False):
+    keys, sort_by = TREND_VIEWS[view]
+    with stage(f'{view}_filter', _frame_rows(cube)) as record:
+        filtered_df = get_filtered_data(cube, *filters)
+        record['rows_out'] = len(filtered_df)
+    if empty_frame and filtered_df.empty:
+        return pd.DataFrame()
+
+    with stage(f'{view}_rollup', len(filtered_df)) as record:
+        table = rollup(filtered_df, keys).sort_values(sort_by)
+        record['rows_out'] = len(table)
+    return table
+
+
+def weekly_trend_table(cube, customer_filter=None, year_filter=None, month_filter=None, fiscal_year_filter=None):
+    # One row per fiscal week
+    return _trend_table('weekly', cube, (customer_filter, year_filter, month_filter, fiscal_year_filter),
+                        empty_frame=True)
+
+
+def monthly_trend_table(cube, customer_filter=None):
+    return _trend_table('monthly', cube, (customer_filter,))
+
+
+def yearly_trend_table(cube, customer_filter=None):
+    return _trend_table('yearly', cube, (customer_filter,))
+
+
+def summary_table(table, view):
+    """A trend table's summary columns under their display names, with sales rounded to cents.
+
+    A Name column (as in per-customer exports) is kept first as Customer.
+    """
+    columns = SUMMARY_COLUMNS[view]
+    if 'Name' in table.columns:
+        columns = {'Name': 'Customer', **columns}
+    summary = table[list(columns)].rename(columns=columns)
+    summary['Sales Amount'] = summary['Sales Amount'].round(2)
+    return summary